@@ -0,0 +1,258 @@
+"""
+Пакетный поиск лиц и глаз без GUI.
+
+Обрабатывает видеофайлы, отдельные изображения и каталоги с ними,
+раскидывая работу по пулу процессов, и пишет результат в JSONL:
+одна строка на кадр.
+
+    python batch_detect.py archive/ clip.mp4 -o faces.jsonl --annotate out/
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+import cv2
+
+from face_detector import FaceEyeDetector, add_detector_arguments, detector_options, draw_detections, face_to_dict
+from tracking import FaceTracker
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mkv", ".mov"}
+
+# Детектор свой в каждом процессе пула (каскады не передаются между процессами)
+_worker = {}
+
+
+def _init_worker(options, track_every, annotate_dir, annotate_root):
+    _worker["detector"] = FaceEyeDetector(**options)
+    _worker["track_every"] = track_every
+    _worker["annotate_dir"] = annotate_dir
+    _worker["annotate_root"] = annotate_root
+
+
+def make_record(source, frame_index, timestamp, faces):
+    return {
+        "source": source,
+        "frame": frame_index,
+        "timestamp": timestamp,
+        "faces": [face_to_dict(face) for face in faces],
+    }
+
+
+def _process_image(path):
+    frame = cv2.imread(path)
+    if frame is None:
+        return [{"source": path, "frame": 0, "timestamp": None, "error": "не удалось прочитать изображение"}]
+
+    faces = _worker["detector"].detect(frame)
+    annotate_dir = _worker["annotate_dir"]
+    if annotate_dir:
+        target = annotation_path(annotate_dir, _worker["annotate_root"], path)
+        cv2.imwrite(target, draw_detections(frame, faces))
+    return [make_record(path, 0, None, faces)]
+
+
+def _process_video_chunk(path, start, stop, fps):
+    """Кадры [start, stop) одного видео; stop=None - до конца файла"""
+    detector = _worker["detector"]
+    if _worker["track_every"] > 0:
+        # Трекер живёт в пределах куска: между кусками состояние не переносится
+        detector = FaceTracker(detector, detect_every=_worker["track_every"])
+
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    records = []
+    index = start
+    while stop is None or index < stop:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        timestamp = index / fps if fps else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        records.append(make_record(path, index, round(timestamp, 3), detector.detect(frame)))
+        index += 1
+    cap.release()
+    return records
+
+
+def _run_task(task):
+    kind, args = task
+    if kind == "image":
+        return _process_image(*args)
+    return _process_video_chunk(*args)
+
+
+def is_video(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def collect_files(paths, extensions=IMAGE_EXTENSIONS | VIDEO_EXTENSIONS):
+    """Разворачивает каталоги в отсортированный список файлов с нужными расширениями"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if os.path.splitext(name)[1].lower() in extensions:
+                        files.append(os.path.join(root, name))
+        else:
+            files.append(path)
+    return files
+
+
+def common_root(files):
+    """Общий каталог входных файлов: от него строятся пути разметки"""
+    if not files:
+        return os.getcwd()
+    return os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+
+
+def annotation_path(annotate_dir, root, path, suffix="", ext=None):
+    """
+    Путь размеченного файла в annotate_dir с той же вложенностью относительно
+    root, что и у исходного: a/img.jpg и b/img.jpg не затирают друг друга
+    """
+    stem, source_ext = os.path.splitext(os.path.relpath(os.path.abspath(path), root))
+    target = os.path.join(annotate_dir, stem + suffix + (ext or source_ext))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    return target
+
+
+def make_tasks(files, chunk_size):
+    """Изображение - одна задача, длинное видео режется на куски по chunk_size кадров"""
+    for path in files:
+        if not is_video(path):
+            yield "image", (path,)
+            continue
+
+        cap = cv2.VideoCapture(path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if total <= 0:
+            # Число кадров неизвестно (поток, битый индекс) - читаем целиком
+            yield "video", (path, 0, None, fps)
+            continue
+        for start in range(0, total, chunk_size):
+            yield "video", (path, start, min(start + chunk_size, total), fps)
+
+
+class VideoAnnotator:
+    """
+    Размеченное видео пишется в главном процессе: записи приходят по порядку,
+    поэтому кадры достаточно ещё раз последовательно декодировать.
+    Подкласс рисует запись на кадре (draw) и, если записи идут не на каждый
+    кадр, переопределяет чтение и запись кадров.
+    """
+
+    suffix = "_annotated"  # Добавляется к имени исходного видео
+
+    def __init__(self, annotate_dir, root):
+        self.annotate_dir = annotate_dir
+        self.root = root  # Общий каталог входных видео: вложенность сохраняется в annotate_dir
+        self.source = None
+        self.cap = None
+        self.writer = None
+
+    def add(self, record):
+        if record["source"] != self.source:
+            self.close()
+            self._open(record["source"])
+        frame = self._read(record)
+        if frame is not None:
+            self._write(self.draw(frame, record), record)
+
+    def draw(self, frame, record):
+        raise NotImplementedError
+
+    def _read(self, record):
+        """Кадр записи record или None, если видео кончилось"""
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def _write(self, frame, record):
+        self.writer.write(frame)
+
+    def _fps(self):
+        return self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    def _open(self, source):
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        target = annotation_path(self.annotate_dir, self.root, source, self.suffix, ".mp4")
+        self.writer = cv2.VideoWriter(target,
+                                      cv2.VideoWriter_fourcc(*"mp4v"), max(self._fps(), 1.0), size)
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.writer.release()
+        self.source = self.cap = self.writer = None
+
+
+class FaceAnnotator(VideoAnnotator):
+    suffix = "_faces"
+
+    def draw(self, frame, record):
+        faces = [(tuple(f["box"]), [tuple(e) for e in f["eyes"]], f["track_id"]) for f in record["faces"]]
+        return draw_detections(frame, faces)
+
+
+def _init_pool_worker(initializer, *initargs):
+    # Параллелизм даёт пул, внутренние потоки OpenCV только мешали бы
+    cv2.setNumThreads(1)
+    initializer(*initargs)
+
+
+def run_tasks(run_task, tasks, workers, initializer, initargs, output, annotator=None):
+    """
+    Выполняет задачи в пуле процессов и пишет их записи в JSONL-файл output
+    ("-" - stdout) по мере готовности; записи видео получает annotator
+    """
+    out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8")
+    try:
+        with multiprocessing.Pool(workers, initializer=_init_pool_worker,
+                                  initargs=(initializer, *initargs)) as pool:
+            # imap сохраняет порядок задач, поэтому кадры в JSONL идут по порядку
+            for records in pool.imap(run_task, tasks):
+                for record in records:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    if annotator is not None and is_video(record["source"]):
+                        annotator.add(record)
+                out.flush()
+    finally:
+        if annotator is not None:
+            annotator.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный поиск лиц и глаз (JSONL)")
+    parser.add_argument("inputs", nargs="+", help="видеофайлы, изображения или каталоги")
+    parser.add_argument("-o", "--output", default="-", help="файл JSONL (по умолчанию stdout)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument("--chunk-size", type=int, default=500, help="кадров видео в одной задаче")
+    parser.add_argument("--annotate", metavar="DIR", default=None,
+                        help="сохранять размеченные изображения и видео в каталог")
+    parser.add_argument("--track", type=int, default=0, metavar="N",
+                        help="для видео: полный поиск лиц раз в N кадров, между ними слежение")
+    add_detector_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.annotate:
+        os.makedirs(args.annotate, exist_ok=True)
+
+    files = collect_files(args.inputs)
+    root = common_root(files)
+    annotator = FaceAnnotator(args.annotate, root) if args.annotate else None
+    run_tasks(_run_task, make_tasks(files, args.chunk_size), args.workers, _init_worker,
+              (detector_options(args), args.track, args.annotate, root), args.output, annotator)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Пакетный поиск объектов-шаблонов в видео без GUI.
+
+Видео декодируется так быстро, как позволяет процессор (без привязки к
+частоте кадров, как в SiftMatcherApp), длинные файлы режутся на куски и
+обрабатываются в пуле процессов. Результат - JSONL, одна строка на
+проанализированный кадр: число совпадений, инлайеров и углы объектов.
+
+    python batch_match.py recordings/ -t obj1.png obj2.png -o matches.jsonl
+    python batch_match.py clip.mp4 -t obj.png --stride 5 --track 10 --annotate out/
+    python batch_match.py clip.mp4 -t obj.png --keyframes --features orb
+"""
+import argparse
+import os
+
+import cv2
+
+try:
+    import av
+except ImportError:  # PyAV нужен только для --keyframes
+    av = None
+
+from batch_detect import VideoAnnotator, collect_files, common_root, is_video, make_tasks, run_tasks
+from descriptor_store import DEFAULT_STORE_DIR, DescriptorStore
+from feature_backends import add_backend_arguments, create_backend
+from object_matcher import SiftMatcher, draw_object, match_to_dict
+from object_tracking import HomographyTracker
+
+# Матчер свой в каждом процессе пула; шаблоны берутся из кэша дескрипторов
+_worker = {}
+
+
+def create_matcher(templates, options, store_dir):
+    """Матчер с загруженными шаблонами; номера шаблонов одинаковы во всех процессах"""
+    options = dict(options)
+    backend = create_backend(options.pop("features"), index=options.pop("index"))
+    store = DescriptorStore(store_dir) if store_dir else None
+    matcher = SiftMatcher(backend=backend, store=store, **options)
+    for path in templates:
+        if matcher.add_reference_file(path) is None:
+            raise ValueError(f"не удалось прочитать шаблон {path}")
+    return matcher
+
+
+def _init_worker(templates, options, store_dir, track_every, stride, keyframes):
+    _worker["matcher"] = create_matcher(templates, options, store_dir)
+    _worker["track_every"] = track_every
+    _worker["stride"] = stride
+    _worker["keyframes"] = keyframes
+
+
+def make_record(source, frame_index, timestamp, matches, templates):
+    return {
+        "source": source,
+        "frame": frame_index,
+        "timestamp": timestamp,
+        "keypoints": len(matches.frame_kp or ()),
+        "tracked": matches.tracked,
+        "objects": [match_to_dict(result, templates) for result in matches.results],
+    }
+
+
+def read_frames(path, start, stop, stride):
+    """(номер, кадр) для кадров [start, stop) с шагом stride по сквозной нумерации"""
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    index = start
+    while stop is None or index < stop:
+        if index % stride:
+            # Пропускаемый кадр только извлекается из потока, без преобразования в BGR
+            if not cap.grab():
+                break
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, frame
+        index += 1
+    cap.release()
+
+
+def read_keyframes(path, start, stop, fps):
+    """(номер, кадр) только для ключевых кадров: остальные декодер даже не распаковывает"""
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = "NONKEY"
+        fps = fps or float(stream.average_rate or 25)
+        offset = stream.start_time or 0
+        if start:
+            # Переход к ключевому кадру не позже начала куска
+            container.seek(offset + int(start / fps / stream.time_base), stream=stream)
+        for frame in container.decode(stream):
+            if frame.pts is None:
+                continue
+            index = round(float((frame.pts - offset) * stream.time_base) * fps)
+            if index < start:
+                continue
+            if stop is not None and index >= stop:
+                break
+            yield index, frame.to_ndarray(format="bgr24")
+
+
+def _process_video_chunk(path, start, stop, fps):
+    """Кадры [start, stop) одного видео; stop=None - до конца файла"""
+    matcher = _worker["matcher"]
+    # Матчер общий для всех кусков процесса: положения объектов из чужого
+    # куска или файла не должны сужать поиск
+    matcher.reset()
+    finder = matcher
+    if _worker["track_every"] > 0:
+        # Трекер живёт в пределах куска: между кусками состояние не переносится
+        finder = HomographyTracker(matcher, redetect_every=_worker["track_every"])
+
+    if _worker["keyframes"]:
+        frames = read_keyframes(path, start, stop, fps)
+    else:
+        frames = read_frames(path, start, stop, _worker["stride"])
+
+    records = []
+    for index, frame in frames:
+        timestamp = round(index / fps, 3) if fps else None
+        records.append(make_record(path, index, timestamp, finder.match(frame), matcher.templates))
+    return records
+
+
+def _run_task(task):
+    _, args = task
+    return _process_video_chunk(*args)
+
+
+class MatchAnnotator(VideoAnnotator):
+    """
+    Размеченное видео с найденными объектами; непроанализированные кадры
+    пропускаются без декодирования.
+
+    frame_step - во сколько раз реже исходного идут записи. None - шаг
+    неравномерный (ключевые кадры): видео пишется с исходной частотой, а
+    каждый размеченный кадр держится до следующей записи, чтобы длительность
+    совпадала с исходной.
+    """
+
+    suffix = "_objects"
+
+    def __init__(self, annotate_dir, frame_step, root):
+        super().__init__(annotate_dir, root)
+        self.frame_step = frame_step
+        self.index = 0
+        self.held = None  # (кадр, номер) ждёт следующей записи, если frame_step=None
+
+    def draw(self, frame, record):
+        for obj in record["objects"]:
+            if obj["corners"] is not None:
+                draw_object(frame, obj["corners"], obj["name"])
+        return frame
+
+    def _read(self, record):
+        while self.index < record["frame"]:
+            if not self.cap.grab():
+                return None
+            self.index += 1
+        self.index += 1
+        return super()._read(record)
+
+    def _write(self, frame, record):
+        if self.frame_step is not None:
+            self.writer.write(frame)
+            return
+        self._write_held(record["frame"])
+        self.held = (frame, record["frame"])
+
+    def _write_held(self, next_index=None):
+        if self.held is None:
+            return
+        frame, index = self.held
+        repeat = next_index - index if next_index is not None else 1
+        for _ in range(max(repeat, 1)):
+            self.writer.write(frame)
+        self.held = None
+
+    def _fps(self):
+        return super()._fps() / (self.frame_step or 1)
+
+    def _open(self, source):
+        self.index = 0
+        super()._open(source)
+
+    def close(self):
+        if self.cap is not None:
+            # Последний ключевой кадр держится до конца исходного видео
+            total = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            self._write_held(total if total > 0 else None)
+        super().close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный поиск объектов в видео (JSONL)")
+    parser.add_argument("inputs", nargs="+", help="видеофайлы или каталоги с ними")
+    parser.add_argument("-t", "--templates", nargs="+", required=True, help="изображения-шаблоны")
+    parser.add_argument("-o", "--output", default="-", help="файл JSONL (по умолчанию stdout)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument("--chunk-size", type=int, default=500, help="кадров видео в одной задаче")
+    sampling = parser.add_mutually_exclusive_group()
+    sampling.add_argument("--stride", type=int, default=1, metavar="N", help="анализировать каждый N-й кадр")
+    sampling.add_argument("--keyframes", action="store_true",
+                          help="декодировать и анализировать только ключевые кадры (нужен PyAV)")
+    parser.add_argument("--track", type=int, default=0, metavar="N",
+                        help="полный поиск раз в N анализируемых кадров, между ними слежение")
+    parser.add_argument("--annotate", metavar="DIR", default=None, help="сохранять размеченные видео в каталог")
+    parser.add_argument("--roi", type=float, default=None, metavar="PAD",
+                        help="искать точки только вокруг прошлого положения объекта")
+    parser.add_argument("--max-per-cell", type=int, default=None, metavar="N",
+                        help="не больше N точек кадра на клетку 64x64")
+    parser.add_argument("--cross-check", action="store_true", help="только взаимные совпадения")
+    parser.add_argument("--descriptor-cache", metavar="DIR", default=DEFAULT_STORE_DIR,
+                        help="каталог кэша точек и дескрипторов шаблонов")
+    parser.add_argument("--no-descriptor-cache", action="store_true", help="не использовать кэш дескрипторов")
+    add_backend_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.keyframes and av is None:
+        parser.error("для --keyframes нужен пакет av (pip install av)")
+    if args.stride < 1:
+        parser.error("--stride должен быть не меньше 1")
+    if args.annotate:
+        os.makedirs(args.annotate, exist_ok=True)
+
+    options = dict(features=args.features, index=args.index, roi_padding=args.roi,
+                   max_per_cell=args.max_per_cell, cross_check=args.cross_check)
+    store_dir = None if args.no_descriptor_cache else args.descriptor_cache
+    try:
+        # Заодно прогревает кэш: процессы пула получат шаблоны уже готовыми
+        create_matcher(args.templates, options, store_dir)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    files = [path for path in collect_files(args.inputs) if is_video(path)]
+    frame_step = None if args.keyframes else args.stride
+    annotator = MatchAnnotator(args.annotate, frame_step, common_root(files)) if args.annotate else None
+    run_tasks(_run_task, make_tasks(files, args.chunk_size), args.workers, _init_worker,
+              (args.templates, options, store_dir, args.track, args.stride, args.keyframes),
+              args.output, annotator)
+
+
+if __name__ == "__main__":
+    main()
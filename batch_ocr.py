@@ -0,0 +1,197 @@
+"""
+Headless batch OCR for folders of scans.
+
+Directories are walked for images, multi-page TIFF/GIF files are expanded
+into one task per page while the pool is already busy (only headers are
+read for that; pages are decoded by the workers), and pages are recognized
+in parallel worker processes. Each page becomes
+one JSONL line with its text and timing; lines are flushed as they come, so
+an interrupted run can be continued with --resume. Text of pages seen
+before (same pixels, language and config) comes from the OCR cache.
+
+    python batch_ocr.py scans/ -o text.jsonl --lang "English + Russian"
+    python batch_ocr.py scans/ inbox/fax.tiff -o text.jsonl --resume
+    python batch_ocr.py posters/ -o text.jsonl --regions --deskew --dpi 300
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from PIL import Image
+
+import ocr
+from batch_detect import collect_files
+from ocr_cache import DEFAULT_CACHE_DIR, OCRCache
+from ocr_engines import add_engine_arguments, create_engine
+from ocr_regions import recognize_layout, regions_to_text
+
+OCR_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff"}
+
+_worker = {}
+
+
+def _init_worker(lang_code, tesseract_threads, cache_dir, engine, page_options):
+    # The pool provides the parallelism; Tesseract's own OpenMP threads on
+    # top of it would oversubscribe the CPUs. The limit is inherited by the
+    # tesseract processes pytesseract starts and read by tesserocr's
+    # libtesseract, which the engine loads only after this point.
+    os.environ["OMP_THREAD_LIMIT"] = str(tesseract_threads)
+    _worker["lang_code"] = lang_code
+    # Each worker process keeps its Tesseract instances warm across pages
+    _worker["engine"] = create_engine(engine)
+    _worker["cache"] = OCRCache(cache_dir) if cache_dir else None
+    _worker["page_options"] = page_options
+
+
+def resolve_language(value):
+    """Language name from ocr.LANGUAGES or a raw Tesseract code such as 'eng+deu'"""
+    return ocr.LANGUAGES.get(value, value)
+
+
+def make_record(source, page, pages, **fields):
+    return {"source": source, "page": page, "pages": pages, **fields}
+
+
+def make_page_tasks(files, done=frozenset()):
+    """
+    (path, page, pages) for every page not in done. Only the file header is
+    read here to count frames; pages are decoded by the workers.
+    """
+    for path in files:
+        try:
+            with Image.open(path) as image:
+                pages = getattr(image, "n_frames", 1)
+        except (OSError, ValueError) as e:
+            yield path, None, None, f"cannot open image: {e}"
+            continue
+        for page in range(pages):
+            if (path, page) not in done:
+                yield path, page, pages, None
+
+
+def _process_page(task):
+    path, page, pages, error = task
+    if error is not None:
+        return make_record(path, page, pages, error=error)
+
+    lang_code = _worker["lang_code"]
+    cache = _worker["cache"]
+    hits = cache.hits if cache is not None else 0
+    started = time.perf_counter()
+    try:
+        with Image.open(path) as image:
+            image.seek(page)
+            # GIF and palette TIFF frames are not something Tesseract reads well
+            frame = image.convert("RGB") if image.mode in ("P", "PA", "1") else image.copy()
+        decoded = time.perf_counter()
+        fields = _recognize_frame(frame, lang_code, cache)
+    except Exception as e:
+        return make_record(path, page, pages, lang=lang_code, error=str(e))
+    finished = time.perf_counter()
+    return make_record(path, page, pages, lang=lang_code, **fields,
+                       width=frame.width, height=frame.height,
+                       cached=cache is not None and cache.hits > hits,
+                       decode_ms=round((decoded - started) * 1000.0, 1),
+                       ocr_ms=round((finished - decoded) * 1000.0, 1))
+
+
+def _recognize_frame(frame, lang_code, cache):
+    """text (and regions with boxes, when splitting into regions) of one decoded page"""
+    options = _worker["page_options"]
+    regions = recognize_layout(frame, lang_code, cache=cache, engine=_worker["engine"], **options)
+    fields = {"text": regions_to_text(regions)}
+    if options["regions"]:
+        # Boxes are in the coordinates of the page after deskew and DPI scaling
+        fields["regions"] = [{"box": list(region.box), "text": region.text} for region in regions]
+    return fields
+
+
+def read_done_pages(path):
+    """(source, page) pairs already recognized in an earlier run's output"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    # A write cut off inside a multi-byte character must not stop the whole read
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Last line cut off by the interruption
+            if "text" in record:
+                done.add((record["source"], record["page"]))
+    return done
+
+
+def open_output(path, resume):
+    if path == "-":
+        return sys.stdout
+    if not resume:
+        return open(path, "w", encoding="utf-8")
+    # The last byte is checked in binary: an interrupted write can end inside
+    # a multi-byte character that text mode would fail to decode
+    complete = True
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            complete = f.read(1) == b"\n"
+    out = open(path, "a", encoding="utf-8")
+    if not complete:
+        out.write("\n")  # Keep a half-written line from swallowing the next record
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch OCR of images and multi-page TIFF/GIF (JSONL)")
+    parser.add_argument("inputs", nargs="+", help="images or directories with them")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file (stdout by default)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="number of processes")
+    parser.add_argument("-l", "--lang", default="English",
+                        help=f"one of {', '.join(ocr.LANGUAGES)} or a Tesseract code")
+    parser.add_argument("--tesseract-threads", type=int, default=1, metavar="N",
+                        help="OpenMP threads per Tesseract call (OMP_THREAD_LIMIT)")
+    parser.add_argument("--resume", action="store_true",
+                        help="append to the output, skipping pages it already has text for")
+    parser.add_argument("--ocr-cache", metavar="DIR", default=DEFAULT_CACHE_DIR,
+                        help="directory of the OCR result cache")
+    parser.add_argument("--no-ocr-cache", action="store_true", help="do not use the OCR result cache")
+    parser.add_argument("--regions", action="store_true",
+                        help="find text regions and recognize them as separate tiles (boxes go to JSONL)")
+    parser.add_argument("--tile-workers", type=int, default=1, metavar="N",
+                        help="threads per process recognizing the tiles of one page")
+    parser.add_argument("--binarize", action="store_true", help="adaptive binarization before OCR")
+    parser.add_argument("--deskew", action="store_true", help="straighten rotated text before OCR")
+    parser.add_argument("--dpi", type=int, default=None, metavar="DPI",
+                        help="rescale pages whose files store their resolution to this DPI")
+    add_engine_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.resume and args.output == "-":
+        parser.error("--resume needs an output file")
+
+    lang_code = resolve_language(args.lang)
+    cache_dir = None if args.no_ocr_cache else args.ocr_cache
+    page_options = dict(regions=args.regions, workers=args.tile_workers,
+                        binarize=args.binarize, deskew=args.deskew, dpi=args.dpi)
+    done = read_done_pages(args.output) if args.resume else frozenset()
+    tasks = make_page_tasks(collect_files(args.inputs, OCR_EXTENSIONS), done)
+
+    out = open_output(args.output, args.resume)
+    try:
+        with multiprocessing.Pool(args.workers, initializer=_init_worker,
+                                  initargs=(lang_code, args.tesseract_threads, cache_dir, args.engine,
+                                            page_options)) as pool:
+            # imap keeps pages in order; tasks are just (path, page), pixels never cross processes
+            for record in pool.imap(_process_page, tasks):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
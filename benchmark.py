@@ -0,0 +1,349 @@
+"""
+Воспроизводимые замеры производительности без камеры и GUI.
+
+Прогоняет записанные или синтетические кадры и изображения через те же
+пути, что и приложения: FaceEyeDetector/FaceTracker (main.py),
+SiftMatcher/HomographyTracker + render (SiftMatcherApp.process_frame) и ocr.recognize
+(OCRApp.extract_text). Каждый сценарий запускается в отдельном процессе,
+чтобы пиковая память считалась честно.
+
+    python benchmark.py                                   # синтетические данные
+    python benchmark.py --video rec.mp4 --reference obj.png --ocr-images scans/
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --compare bench_baseline.json --tolerance 0.15
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from instrumentation import Profiler
+
+CASES = ("faces", "faces_tracking", "sift", "sift_tracking", "ocr")
+
+# Стадии, которые сценарий обязан пройти; иначе замер неполный (например, на видео без лиц)
+EXPECTED_STAGES = {
+    "faces": ("face_cascade", "eye_cascade"),
+    "faces_tracking": ("face_cascade", "eye_cascade", "face_track"),
+}
+
+
+# --- Источники данных ---
+
+def load_video(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise ValueError(f"не удалось прочитать кадры из {path}")
+    return frames
+
+
+def draw_face(image, center, size):
+    """Рисованное лицо, которое каскад Хаара принимает за настоящее"""
+    cx, cy = center
+    s = size
+    cv2.ellipse(image, (cx, cy), (int(s * 0.8), s), 0, 0, 360, (150, 170, 200), -1)
+    for side in (-1, 1):
+        eye = (cx + side * int(s * 0.35), cy - int(s * 0.2))
+        cv2.ellipse(image, eye, (int(s * 0.18), int(s * 0.09)), 0, 0, 360, (245, 245, 245), -1)
+        cv2.circle(image, eye, int(s * 0.08), (30, 30, 30), -1)
+        cv2.line(image, (cx + side * int(s * 0.15), cy - int(s * 0.42)),
+                 (cx + side * int(s * 0.55), cy - int(s * 0.45)), (40, 40, 60), max(2, s // 15))
+    cv2.ellipse(image, (cx, cy + int(s * 0.1)), (int(s * 0.08), int(s * 0.15)), 0, 0, 360, (120, 140, 170), -1)
+    cv2.ellipse(image, (cx, cy + int(s * 0.5)), (int(s * 0.3), int(s * 0.08)), 0, 0, 360, (60, 60, 140), -1)
+
+
+def synthetic_scene(count, size=(640, 480), seed=0):
+    """
+    Плавный фон с движущимися фигурами и медленно плывущим лицом: каскады
+    лиц и глаз и локальный поиск трекера получают стабильную нагрузку
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = np.zeros((h, w, 3), np.uint8)
+    base[:] = np.linspace(40, 200, w, dtype=np.uint8)[None, :, None]
+    base = cv2.add(base, rng.integers(0, 30, base.shape, dtype=np.uint8))
+    shapes = [(rng.integers(0, w), rng.integers(0, h), rng.integers(20, 80), tuple(int(c) for c in rng.integers(0, 255, 3)))
+              for _ in range(12)]
+
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        for j, (x, y, r, color) in enumerate(shapes):
+            dx = int(20 * np.sin((i + j * 7) / 10.0))
+            cv2.circle(frame, (int(x) + dx, int(y)), int(r), color, -1)
+        draw_face(frame, (w // 2 + int(w * 0.15 * np.sin(i / 15.0)), h // 2), min(w, h) // 5)
+        frames.append(cv2.GaussianBlur(frame, (5, 5), 0))
+    return frames
+
+
+def synthetic_reference(size=(300, 300), seed=1):
+    """Текстурный шаблон с множеством углов, на котором SIFT находит точки"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    img = np.full((h, w), 128, np.uint8)
+    for _ in range(60):
+        p1 = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+        p2 = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+        cv2.rectangle(img, p1, p2, int(rng.integers(0, 255)), int(rng.choice([-1, 2])))
+    return img
+
+
+def synthetic_sift_frames(reference, count, size=(640, 480), seed=2):
+    """Шаблон, плавно вращаемый и сдвигаемый поверх шумного фона"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    background = cv2.GaussianBlur(rng.integers(0, 255, (h, w), dtype=np.uint8), (5, 5), 0)
+    rh, rw = reference.shape
+    frames = []
+    for i in range(count):
+        angle = 15 * np.sin(i / 15.0)
+        M = cv2.getRotationMatrix2D((rw / 2, rh / 2), angle, 0.8)
+        M[:, 2] += (w / 2 - rw / 2 + 40 * np.cos(i / 20.0), h / 2 - rh / 2)
+        warped = cv2.warpAffine(reference, M, (w, h))
+        mask = cv2.warpAffine(np.full_like(reference, 255), M, (w, h))
+        frame = np.where(mask > 0, warped, background)
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+    return frames
+
+
+def synthetic_pages(count, size=(1240, 1754), seed=3):
+    """Страницы с напечатанным текстом (A4 при 150 dpi)"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    words = ["benchmark", "optical", "character", "recognition", "throughput", "latency",
+             "document", "scanner", "page", "result", "baseline", "regression"]
+    pages = []
+    for _ in range(count):
+        page = np.full((size[1], size[0]), 255, np.uint8)
+        for line in range(30):
+            text = " ".join(rng.choice(words, 6))
+            cv2.putText(page, text, (60, 100 + line * 52), cv2.FONT_HERSHEY_SIMPLEX, 1.1, 0, 2, cv2.LINE_AA)
+        pages.append(Image.fromarray(page))
+    return pages
+
+
+def load_images(directory, limit):
+    from PIL import Image
+
+    names = sorted(n for n in os.listdir(directory)
+                   if os.path.splitext(n)[1].lower() in (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"))
+    images = []
+    for name in names[:limit]:
+        with Image.open(os.path.join(directory, name)) as img:
+            img.load()
+            images.append(img.copy())
+    return images
+
+
+# --- Сценарии ---
+
+def _setup_case(case, options, profiler):
+    """Возвращает (элементы, функция обработки одного элемента)"""
+    frames = options["frames"]
+    if case in ("faces", "faces_tracking"):
+        from face_detector import FaceEyeDetector
+        from tracking import FaceTracker
+
+        items = load_video(options["video"], frames) if options["video"] else synthetic_scene(frames)
+        detector = FaceEyeDetector(profiler=profiler)
+        if case == "faces_tracking":
+            detector = FaceTracker(detector, detect_every=10)
+        return items, detector.detect
+
+    if case in ("sift", "sift_tracking"):
+        from object_matcher import MatchRenderer, SiftMatcher
+        from object_tracking import HomographyTracker
+
+        matcher = SiftMatcher(profiler=profiler)
+        if options["reference"]:
+            reference = cv2.imread(options["reference"], cv2.IMREAD_GRAYSCALE)
+        else:
+            reference = synthetic_reference()
+        template = matcher.add_reference(reference)
+        if options["video"]:
+            items = load_video(options["video"], frames)
+        else:
+            items = synthetic_sift_frames(template.image, frames)
+
+        tracker = HomographyTracker(matcher, redetect_every=15) if case == "sift_tracking" else matcher
+        # Отрисовка в размер холста SiftMatcherApp по умолчанию
+        renderer = MatchRenderer(matcher)
+
+        def process(frame):
+            return renderer.render(frame, tracker.match(frame), (800, 600))
+        return items, process
+
+    if case == "ocr":
+        import ocr
+        import pytesseract
+
+        # Без установленного Tesseract сценарий пропускается
+        pytesseract.get_tesseract_version()
+        count = options["ocr_pages"]
+        items = load_images(options["ocr_images"], count) if options["ocr_images"] else synthetic_pages(count)
+        return items, lambda image: ocr.recognize(image, options["ocr_lang"])
+
+    raise ValueError(f"неизвестный сценарий: {case}")
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(case, options):
+    """Выполняется в отдельном процессе"""
+    cv2.setNumThreads(options["threads"])
+    profiler = Profiler(window=100000)
+    try:
+        items, process = _setup_case(case, options, profiler)
+    except Exception as e:
+        return {"skipped": f"{type(e).__name__}: {e}"}
+
+    warmup = min(options["warmup"], len(items))
+    for item in items[:warmup]:
+        process(item)
+    # Статистика стадий только по замеряемым элементам
+    profiler.reset()
+
+    latencies = []
+    started = time.perf_counter()
+    # Повторяем последовательность, пока не наберём нужное число замеров
+    for i in range(options["repeat"] * len(items)):
+        t0 = time.perf_counter()
+        process(items[i % len(items)])
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    stages = {name: s["p50_ms"] for name, s in profiler.summary().items()}
+    result = {
+        "items": len(latencies),
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "latency_ms": {"mean": float(latencies_ms.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)},
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages_p50_ms": stages,
+    }
+    missing = [stage for stage in EXPECTED_STAGES.get(case, ()) if stage not in stages]
+    if missing:
+        result["partial"] = missing
+    return result
+
+
+# --- Сравнение с эталоном ---
+
+def compare(results, baseline, tolerance):
+    """Список регрессий: пропускная способность упала или p95 вырос больше допуска"""
+    regressions = []
+    for case, current in results.items():
+        reference = baseline.get("results", {}).get(case)
+        if not reference or "skipped" in reference or "skipped" in current:
+            continue
+        if current["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(f"{case}: пропускная способность {current['throughput']:.2f} "
+                               f"< эталона {reference['throughput']:.2f}/с")
+        if current["latency_ms"]["p95"] > reference["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(f"{case}: p95 {current['latency_ms']['p95']:.1f} мс "
+                               f"> эталона {reference['latency_ms']['p95']:.1f} мс")
+    return regressions
+
+
+def environment():
+    return {"python": platform.python_version(), "opencv": cv2.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count()}
+
+
+def print_table(results, baseline=None):
+    print(f"{'сценарий':<16}{'шт/с':>9}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}{'RSS МБ':>9}{'Δ шт/с':>9}")
+    for case, r in results.items():
+        if "skipped" in r:
+            print(f"{case:<16}пропущен ({r['skipped']})")
+            continue
+        delta = ""
+        ref = (baseline or {}).get("results", {}).get(case)
+        if ref and "throughput" in ref:
+            delta = f"{(r['throughput'] / ref['throughput'] - 1) * 100:+.1f}%"
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        lat = r["latency_ms"]
+        print(f"{case:<16}{r['throughput']:>9.2f}{lat['p50']:>9.1f}{lat['p95']:>9.1f}{lat['p99']:>9.1f}"
+              f"{rss:>9}{delta:>9}")
+        if r.get("partial"):
+            print(f"{'':<16}неполный замер: не было стадий {', '.join(r['partial'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности детекторов")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--video", help="записанное видео вместо синтетических кадров")
+    parser.add_argument("--reference", help="изображение-шаблон для сценариев sift")
+    parser.add_argument("--ocr-images", metavar="DIR", help="каталог с изображениями для OCR")
+    parser.add_argument("--ocr-lang", default="eng", help="языки Tesseract, например eng+rus")
+    parser.add_argument("--frames", type=int, default=100, help="кадров в последовательности")
+    parser.add_argument("--ocr-pages", type=int, default=5, help="страниц для OCR")
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз прогнать последовательность")
+    parser.add_argument("--warmup", type=int, default=5, help="непрогнанных в замер элементов в начале")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="потоков OpenCV (1 - стабильнее для сравнения сборок)")
+    parser.add_argument("--json", metavar="PATH", help="сохранить результаты в файл")
+    parser.add_argument("--save-baseline", metavar="PATH", help="сохранить результаты как эталон")
+    parser.add_argument("--compare", metavar="PATH", help="сравнить с эталоном, код 1 при регрессии")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="допустимое ухудшение (доля)")
+    args = parser.parse_args(argv)
+
+    options = {key: getattr(args, key) for key in
+               ("video", "reference", "ocr_images", "ocr_lang", "frames", "ocr_pages", "repeat", "warmup", "threads")}
+
+    results = {}
+    # spawn: каждый сценарий в чистом процессе, пиковая память не смешивается
+    context = multiprocessing.get_context("spawn")
+    for case in args.cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[case] = pool.submit(run_case, case, options).result()
+
+    report = {"environment": environment(), "options": options, "results": results}
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_table(results, baseline)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print("РЕГРЕССИЯ:", line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
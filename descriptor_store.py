@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+# Каталог кэша по умолчанию: общий для всех запусков и процессов пользователя
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "FindFaceAndEyes", "descriptors")
+
+# Поля cv2.KeyPoint в порядке столбцов keypoints.npy
+KEYPOINT_FIELDS = ("x", "y", "size", "angle", "response", "octave", "class_id")
+
+
+def keypoints_to_array(keypoints):
+    """Геометрия ключевых точек как массив float32 (N, 7)"""
+    return np.float32([(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id)
+                       for kp in keypoints]).reshape(-1, len(KEYPOINT_FIELDS))
+
+
+def array_to_keypoints(array):
+    return [cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+            for x, y, size, angle, response, octave, class_id in array]
+
+
+class DescriptorStore:
+    """
+    Кэш шаблонов на диске: подготовленное изображение, геометрия точек и
+    дескрипторы лежат в .npy-файлах, которые открываются через mmap.
+    Тёплый старт не декодирует и не считает SIFT, а только отображает
+    файлы в память. Изображение и координаты точек шаблон использует прямо
+    из отображения; дескрипторы индекс шаблонов копирует в свою матрицу,
+    так что общей между процессами остаётся лишь их копия в кэше ОС.
+
+    Ключ - хэш содержимого файла плюс параметры детектора и политики
+    уменьшения шаблона: поменялись параметры - запись просто не найдётся.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(data, params):
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        # Два уровня каталогов, чтобы большие библиотеки не складывались в одну папку
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, key):
+        """(изображение, ключевые точки (N, 7), дескрипторы) или None, если записи нет"""
+        path = self._path(key)
+        try:
+            return tuple(np.load(os.path.join(path, name), mmap_mode="r")
+                         for name in ("image.npy", "keypoints.npy", "descriptors.npy"))
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key, image, keypoints, descriptors):
+        path = self._path(key)
+        if os.path.isdir(path):
+            return
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+
+        # Пишем во временный каталог и переименовываем: параллельный
+        # читатель увидит либо полную запись, либо никакой
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        try:
+            np.save(os.path.join(tmp, "image.npy"), np.ascontiguousarray(image))
+            np.save(os.path.join(tmp, "keypoints.npy"), keypoints)
+            np.save(os.path.join(tmp, "descriptors.npy"), np.ascontiguousarray(descriptors))
+            os.rename(tmp, path)
+        except OSError:
+            # Другой процесс успел записать тот же ключ
+            shutil.rmtree(tmp, ignore_errors=True)
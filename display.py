@@ -0,0 +1,99 @@
+import time
+
+import cv2
+import numpy as np
+import tkinter as tk
+from PIL import Image, ImageTk
+
+
+class CanvasView:
+    """
+    Показ кадров на холсте без выделения памяти на каждый кадр:
+    один элемент холста и один PhotoImage, которые обновляются на месте.
+    Новые буферы создаются только при смене размера изображения.
+    """
+
+    def __init__(self, canvas, anchor=tk.NW):
+        self.canvas = canvas
+        self.anchor = anchor
+        self.item = None
+        self.photo = None
+        self._photo_size = None
+        self._resized = None
+        self._rgb = None
+
+    def resize(self, frame, size, interpolation=cv2.INTER_AREA):
+        """Масштабирует кадр в переиспользуемый буфер и возвращает его"""
+        width, height = size
+        shape = (height, width) + frame.shape[2:]
+        if self._resized is None or self._resized.shape != shape or self._resized.dtype != frame.dtype:
+            self._resized = np.empty(shape, frame.dtype)
+        if frame.shape == shape:
+            # Размер уже нужный: копируем, чтобы исходный кадр остался нетронутым
+            np.copyto(self._resized, frame)
+        else:
+            cv2.resize(frame, (width, height), dst=self._resized, interpolation=interpolation)
+        return self._resized
+
+    def show(self, image, position=(0, 0), is_bgr=True):
+        """Выводит изображение (BGR или RGB) в точку position холста"""
+        if is_bgr:
+            if self._rgb is None or self._rgb.shape != image.shape:
+                self._rgb = np.empty_like(image)
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self._rgb)
+            image = self._rgb
+        pil_image = Image.fromarray(image)
+
+        size = pil_image.size
+        if self.photo is None or self._photo_size != size:
+            self.photo = ImageTk.PhotoImage(image=pil_image)
+            self._photo_size = size
+            if self.item is None:
+                self.item = self.canvas.create_image(*position, image=self.photo, anchor=self.anchor)
+            else:
+                self.canvas.itemconfig(self.item, image=self.photo)
+        else:
+            # Та же картинка Tk, меняются только пиксели
+            self.photo.paste(pil_image)
+        self.canvas.coords(self.item, *position)
+
+
+class FrameScheduler:
+    """
+    Планирование следующего кадра для Tk after(): задержка подстраивается
+    под частоту источника за вычетом измеренного времени обработки.
+    """
+
+    def __init__(self, fps=None, default_fps=30.0, min_delay=1, idle_delay=100):
+        self.min_delay = min_delay
+        self.idle_delay = idle_delay  # Когда источника нет, опрашиваем редко
+        self.default_fps = default_fps
+        self.set_fps(fps)
+        self.processing_time = 0.0  # Скользящее среднее времени обработки, с
+        self._started = None
+
+    def set_fps(self, fps):
+        # Камеры и файлы нередко сообщают 0 или нелепые значения
+        if not fps or fps <= 0 or fps > 240:
+            fps = self.default_fps
+        self.interval = 1.0 / fps
+
+    def begin(self):
+        """Отметка начала обработки кадра"""
+        self._started = time.perf_counter()
+
+    def next_delay(self, idle=False):
+        """Задержка в мс до следующего вызова"""
+        if idle or self._started is None:
+            self._started = None
+            return self.idle_delay
+        elapsed = time.perf_counter() - self._started
+        self._started = None
+        self.processing_time = 0.9 * self.processing_time + 0.1 * elapsed
+        # Если не успеваем, всё равно отдаём Tk хотя бы min_delay на события
+        return max(self.min_delay, int((self.interval - elapsed) * 1000))
+
+    def poll_delay(self):
+        """Задержка повторной проверки, когда новый кадр ещё не готов"""
+        self._started = None
+        return max(self.min_delay, int(self.interval * 500))
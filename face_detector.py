@@ -0,0 +1,209 @@
+import math
+from collections import namedtuple
+
+import cv2
+
+from instrumentation import NULL_PROFILER
+
+# Средняя ширина лица в метрах, по ней пересчитываем расстояние в пиксели
+FACE_WIDTH_M = 0.15
+
+# Найденное лицо: рамка (x, y, w, h), список рамок глаз и номер трека
+Face = namedtuple("Face", ["box", "eyes", "track_id"], defaults=[None])
+
+
+class FaceEyeDetector:
+    """Поиск лиц и глаз Haar-каскадами"""
+
+    def __init__(self, face_scale_factor=1.3, face_min_neighbors=5,
+                 eye_scale_factor=1.1, eye_min_neighbors=10, track_scale_factor=1.1,
+                 detect_width=None, min_distance=None, max_distance=None, fov=60.0,
+                 eye_band=(0.15, 0.6), profiler=NULL_PROFILER):
+        # Загружаем Haar-каскады
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye_tree_eyeglasses.xml')
+
+        self.face_scale_factor = face_scale_factor
+        self.face_min_neighbors = face_min_neighbors
+        self.eye_scale_factor = eye_scale_factor
+        self.eye_min_neighbors = eye_min_neighbors
+        # В маленьком окне вокруг трека можно позволить себе более частую пирамиду
+        self.track_scale_factor = track_scale_factor
+
+        # Ширина кадра, на котором ищутся лица (None - полное разрешение)
+        self.detect_width = detect_width
+        # Ожидаемое расстояние до лиц в метрах и горизонтальный угол обзора камеры
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.fov = fov
+        # Меньше окна обучения каскад лицо не найдёт
+        self.cascade_window = self.face_cascade.getOriginalWindowSize() or (24, 24)
+
+        # Полоса лица (доли высоты сверху), в которой вообще могут быть глаза
+        self.eye_band = eye_band
+
+        # Замер времени стадий (по умолчанию выключен)
+        self.profiler = profiler
+
+    def detect(self, frame):
+        """Поиск на BGR-кадре"""
+        with self.profiler.stage("gray"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return self.detect_gray(gray)
+
+    def detect_gray(self, gray):
+        """
+        Возвращает список Face.
+        Все прямоугольники (x, y, w, h) заданы в координатах кадра.
+        """
+        return [Face(box, self.detect_eyes(gray, box)) for box in self.detect_faces(gray)]
+
+    def detect_faces(self, gray):
+        """
+        Полный проход каскада лиц по кадру.
+        Поиск идёт на уменьшенной копии, рамки пересчитываются в полное разрешение.
+        """
+        frame_h, frame_w = gray.shape[:2]
+        min_face, max_face = face_size_range(frame_w, self.min_distance, self.max_distance, self.fov)
+
+        scale = 1.0
+        if self.detect_width and frame_w > self.detect_width:
+            scale = self.detect_width / frame_w
+            # Самое дальнее лицо не должно стать меньше окна каскада
+            if min_face:
+                scale = max(scale, min(1.0, self.cascade_window[0] / min_face))
+
+        small = gray
+        if scale < 1.0:
+            small = cv2.resize(gray, (round(frame_w * scale), round(frame_h * scale)),
+                               interpolation=cv2.INTER_AREA)
+
+        # Пределы размера отсекают уровни пирамиды, где лица быть не может
+        min_size = (round(min_face * scale),) * 2 if min_face else (0, 0)
+        max_size = (round(max_face * scale),) * 2 if max_face else (0, 0)
+        with self.profiler.stage("face_cascade"):
+            faces = self.face_cascade.detectMultiScale(
+                small, scaleFactor=self.face_scale_factor, minNeighbors=self.face_min_neighbors,
+                minSize=min_size, maxSize=max_size)
+        return [tuple(int(round(v / scale)) for v in face) for face in faces]
+
+    def detect_face_near(self, gray, box, padding=0.5):
+        """
+        Ищет лицо только в окне вокруг прошлой рамки, расширенном на padding
+        от её размера, и только близких к ней масштабов.
+        Возвращает рамку, ближе всего совпадающую с прошлой, или None.
+        """
+        x, y, w, h = box
+        frame_h, frame_w = gray.shape[:2]
+        pad_x, pad_y = int(w * padding), int(h * padding)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(frame_w, x + w + pad_x), min(frame_h, y + h + pad_y)
+        if x1 - x0 < w // 2 or y1 - y0 < h // 2:
+            return None
+
+        with self.profiler.stage("face_track"):
+            faces = self.face_cascade.detectMultiScale(
+                gray[y0:y1, x0:x1], scaleFactor=self.track_scale_factor, minNeighbors=self.face_min_neighbors,
+                minSize=(int(w * 0.7), int(h * 0.7)), maxSize=(int(w * 1.4), int(h * 1.4)))
+        if len(faces) == 0:
+            return None
+
+        candidates = [(int(fx) + x0, int(fy) + y0, int(fw), int(fh)) for (fx, fy, fw, fh) in faces]
+        return max(candidates, key=lambda c: iou(c, box))
+
+    def detect_eyes(self, gray, face):
+        """
+        Поиск глаз в верхней полосе лица.
+        Размеры глаз ограничены долями ширины лица, чтобы каскад не перебирал
+        заведомо невозможные масштабы.
+        """
+        x, y, w, h = face
+        top, bottom = self.eye_band
+        band_y = y + int(h * top)
+        roi_gray = gray[band_y:y + int(h * bottom), x:x+w]
+        with self.profiler.stage("eye_cascade"):
+            eyes = self.eye_cascade.detectMultiScale(
+                roi_gray, scaleFactor=self.eye_scale_factor, minNeighbors=self.eye_min_neighbors,
+                minSize=(int(w * 0.1), int(w * 0.1)), maxSize=(int(w * 0.45), int(w * 0.45)))
+        return [(int(x + ex), int(band_y + ey), int(ew), int(eh)) for (ex, ey, ew, eh) in eyes]
+
+
+def add_detector_arguments(parser):
+    """Общие для всех точек входа параметры детектора"""
+    parser.add_argument("--detect-width", type=int, default=None, metavar="PX",
+                        help="ширина кадра для поиска лиц, рамки пересчитываются в полное разрешение")
+    parser.add_argument("--distance", type=float, nargs=2, default=(None, None), metavar=("MIN", "MAX"),
+                        help="ожидаемое расстояние до лиц в метрах, ограничивает размеры поиска")
+    parser.add_argument("--fov", type=float, default=60.0, help="горизонтальный угол обзора камеры в градусах")
+
+
+def detector_options(args):
+    """Параметры FaceEyeDetector из разобранных аргументов командной строки"""
+    return dict(detect_width=args.detect_width, min_distance=args.distance[0],
+                max_distance=args.distance[1], fov=args.fov)
+
+
+def face_size_range(frame_width, min_distance=None, max_distance=None, fov=60.0):
+    """
+    Ширина лица в пикселях на минимальном и максимальном расстоянии:
+    (наименьшая, наибольшая), None для незаданной границы.
+    """
+    # Ширина сцены в метрах на расстоянии 1 м
+    view_width = 2 * math.tan(math.radians(fov) / 2)
+
+    def to_pixels(distance):
+        return frame_width * FACE_WIDTH_M / (distance * view_width)
+
+    min_face = to_pixels(max_distance) * 0.8 if max_distance else None
+    max_face = to_pixels(min_distance) * 1.25 if min_distance else None
+    return min_face, max_face
+
+
+def move_boxes(boxes, old_face, new_face):
+    """Переносит рамки (например, глаз) из старой рамки лица в новую с учётом масштаба"""
+    ox, oy, ow, oh = old_face
+    nx, ny, nw, nh = new_face
+    sx, sy = nw / ow, nh / oh
+    return [(int(nx + (bx - ox) * sx), int(ny + (by - oy) * sy), int(bw * sx), int(bh * sy))
+            for (bx, by, bw, bh) in boxes]
+
+
+def iou(a, b):
+    """Отношение площади пересечения рамок к площади объединения"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def face_to_dict(face):
+    """Лицо в виде, пригодном для JSON"""
+    return {"box": list(face.box), "eyes": [list(eye) for eye in face.eyes], "track_id": face.track_id}
+
+
+def draw_detections(frame, detections, scale=1.0):
+    """
+    Рисует лица (синим) и глаза (зелёным) прямо на кадре.
+    scale - во сколько раз кадр меньше/больше того, на котором искали лица:
+    одно число или (sx, sy), если пропорции кадра при масштабировании изменились.
+    """
+    sx, sy = scale if isinstance(scale, tuple) else (scale, scale)
+
+    def rect(box, color):
+        x, y, w, h = box
+        x, y, w, h = int(x * sx), int(y * sy), int(w * sx), int(h * sy)
+        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+        return x, y
+
+    for box, eyes, track_id in detections:
+        x, y = rect(box, (255, 0, 0))
+        if track_id is not None:
+            cv2.putText(frame, f"#{track_id}", (x, max(y - 5, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1, cv2.LINE_AA)
+        for eye in eyes:
+            rect(eye, (0, 255, 0))
+    return frame
@@ -0,0 +1,170 @@
+import cv2
+import numpy as np
+
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+
+
+class _FlannIndex:
+    """FLANN: KD-деревья для float-дескрипторов, LSH для бинарных"""
+
+    def __init__(self, descriptors, params, checks):
+        self.checks = checks
+        self.index = cv2.flann_Index(descriptors, params)
+
+    def knn(self, query, k):
+        return self.index.knnSearch(query, k, params=dict(checks=self.checks))
+
+
+class _BruteForceIndex:
+    """Полный перебор: на небольших библиотеках быстрее и точнее FLANN"""
+
+    def __init__(self, descriptors, norm):
+        self.descriptors = descriptors
+        self.norm = norm
+        self.dtype = cv2.CV_32S if norm == cv2.NORM_HAMMING else cv2.CV_32F
+
+    def knn(self, query, k):
+        dist, idx = cv2.batchDistance(query, self.descriptors, self.dtype, normType=self.norm, K=k)
+        return idx, dist
+
+
+class FeatureBackend:
+    """
+    Детектор и дескриптор точек вместе со способом их сопоставления.
+    Float-дескрипторы (SIFT) сравниваются по квадрату L2 через KD-деревья,
+    бинарные (ORB, AKAZE, BRISK) - по Хэммингу через LSH или полным перебором.
+    """
+
+    name = None
+    binary = True
+
+    def __init__(self, index="flann", checks=50):
+        self.detector = self.create()
+        self.index = index  # "flann" или "bf"
+        self.checks = checks
+
+    def create(self):
+        raise NotImplementedError
+
+    def params(self):
+        """Параметры, от которых зависят точки: часть ключа кэша дескрипторов"""
+        return {"detector": self.name}
+
+    @property
+    def dtype(self):
+        return np.uint8 if self.binary else np.float32
+
+    @property
+    def norm(self):
+        return cv2.NORM_HAMMING if self.binary else cv2.NORM_L2SQR
+
+    def ratio_threshold(self, ratio):
+        """
+        Порог теста Лоу в единицах расстояний индекса: KD-дерево и NORM_L2SQR
+        отдают квадраты L2, расстояние Хэмминга линейно
+        """
+        return ratio if self.binary else ratio ** 2
+
+    def build_index(self, descriptors):
+        descriptors = np.ascontiguousarray(descriptors, dtype=self.dtype)
+        if self.index == "bf":
+            return _BruteForceIndex(descriptors, self.norm)
+        if self.binary:
+            # Соседние корзины тоже просматриваются: с multi_probe_level=1 LSH часто
+            # не находит второго соседа
+            params = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=2)
+        else:
+            params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+        return _FlannIndex(descriptors, params, self.checks)
+
+
+class SiftBackend(FeatureBackend):
+    name = "SIFT"
+    binary = False
+
+    def create(self):
+        return cv2.SIFT_create()
+
+    def params(self):
+        return {
+            "detector": self.name,
+            "nfeatures": self.detector.getNFeatures(),
+            "octave_layers": self.detector.getNOctaveLayers(),
+            "contrast_threshold": self.detector.getContrastThreshold(),
+            "edge_threshold": self.detector.getEdgeThreshold(),
+            "sigma": self.detector.getSigma(),
+        }
+
+
+class OrbBackend(FeatureBackend):
+    name = "ORB"
+
+    def create(self):
+        # Стандартных 500 точек мало для поиска на всём кадре
+        return cv2.ORB_create(nfeatures=2000)
+
+    def params(self):
+        return {
+            "detector": self.name,
+            "nfeatures": self.detector.getMaxFeatures(),
+            "scale_factor": self.detector.getScaleFactor(),
+            "levels": self.detector.getNLevels(),
+            "edge_threshold": self.detector.getEdgeThreshold(),
+            "fast_threshold": self.detector.getFastThreshold(),
+        }
+
+
+class AkazeBackend(FeatureBackend):
+    name = "AKAZE"
+
+    def create(self):
+        return cv2.AKAZE_create()
+
+    def params(self):
+        return {
+            "detector": self.name,
+            "descriptor_type": self.detector.getDescriptorType(),
+            "threshold": self.detector.getThreshold(),
+            "octaves": self.detector.getNOctaves(),
+            "octave_layers": self.detector.getNOctaveLayers(),
+        }
+
+
+class BriskBackend(FeatureBackend):
+    name = "BRISK"
+
+    def create(self):
+        return cv2.BRISK_create()
+
+    def params(self):
+        return {
+            "detector": self.name,
+            "threshold": self.detector.getThreshold(),
+            "octaves": self.detector.getOctaves(),
+        }
+
+
+BACKENDS = {
+    "sift": SiftBackend,
+    "orb": OrbBackend,
+    "akaze": AkazeBackend,
+    "brisk": BriskBackend,
+}
+
+
+def create_backend(name="sift", index="flann", checks=50):
+    """Бэкенд по имени: sift, orb, akaze или brisk"""
+    try:
+        backend_class = BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(f"неизвестный детектор: {name}") from None
+    return backend_class(index=index, checks=checks)
+
+
+def add_backend_arguments(parser):
+    """Общие параметры выбора детектора для точек входа"""
+    parser.add_argument("--features", choices=sorted(BACKENDS), default="sift",
+                        help="детектор и дескриптор точек (бинарные сопоставляются по Хэммингу)")
+    parser.add_argument("--index", choices=("flann", "bf"), default="flann",
+                        help="FLANN (KD-дерево / LSH) или полный перебор")
@@ -0,0 +1,192 @@
+"""
+Сравнение детекторов точек (SIFT, ORB, AKAZE, BRISK) на своих шаблонах.
+
+Для каждого бэкенда шаблоны загружаются в SiftMatcher, как в
+SiftMatcherApp, и прогоняются кадры. Без --video кадры синтезируются:
+каждый шаблон переносится случайной перспективой на шумный фон, поэтому
+известна истинная гомография и можно измерить не только скорость, но и
+качество - долю верно найденных объектов и ошибку углов. Кадры из одного
+фона без объектов показывают долю ложных срабатываний.
+
+    python feature_compare.py obj1.png obj2.png
+    python feature_compare.py obj1.png --video rec.mp4 --features orb akaze
+    python feature_compare.py obj1.png --index flann bf --json compare.json
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmark import environment, load_video, synthetic_reference
+from feature_backends import BACKENDS, create_backend
+from instrumentation import Profiler
+from object_matcher import SiftMatcher
+
+# Углы дальше этого от истинных (в среднем, пикселей) - объект найден неверно
+CORRECT_ERROR = 10.0
+
+
+def noise_background(rng, size):
+    w, h = size
+    return cv2.GaussianBlur(rng.integers(0, 255, (h, w), dtype=np.uint8), (7, 7), 0)
+
+
+def synthetic_views(templates, per_template, size=(640, 480), seed=4):
+    """[(кадр, номер шаблона, истинная гомография)] со случайными перспективами"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    views = []
+    for number, image in enumerate(templates):
+        th, tw = image.shape
+        src = np.float32([[0, 0], [tw - 1, 0], [tw - 1, th - 1], [0, th - 1]])
+        for _ in range(per_template):
+            background = noise_background(rng, size)
+            scale = rng.uniform(0.5, 0.9) * min(w / tw, h / th)
+            angle = np.deg2rad(rng.uniform(-30, 30))
+            rotation = np.float32([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+            dst = (src - [tw / 2, th / 2]) @ rotation.T * scale
+            # Перспектива: углы независимо сдвигаются на долю размера
+            dst += rng.uniform(-0.08, 0.08, dst.shape) * scale * max(tw, th)
+            dst += [w / 2 + rng.uniform(-0.1, 0.1) * w, h / 2 + rng.uniform(-0.1, 0.1) * h]
+            H = cv2.getPerspectiveTransform(src, np.float32(dst))
+            warped = cv2.warpPerspective(image, H, (w, h))
+            mask = cv2.warpPerspective(np.full_like(image, 255), H, (w, h))
+            frame = np.where(mask > 0, warped, background)
+            views.append((cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), number, H))
+    return views
+
+
+def empty_frames(count, size=(640, 480), seed=5):
+    """Кадры из одного шумного фона: любое найденное на них - ложное срабатывание"""
+    rng = np.random.default_rng(seed)
+    return [cv2.cvtColor(noise_background(rng, size), cv2.COLOR_GRAY2BGR) for _ in range(count)]
+
+
+def corner_error(template, corners, H):
+    h, w = template.image.shape
+    pts = np.float32([[0, 0], [0, h - 1], [w - 1, h - 1], [w - 1, 0]]).reshape(-1, 1, 2)
+    expected = cv2.perspectiveTransform(pts, H)
+    return float(np.linalg.norm((corners - expected).reshape(-1, 2), axis=1).mean())
+
+
+def evaluate(features, index, references, frames, views, empty=None):
+    """
+    Метрики одного бэкенда; frames - кадры без разметки, views - синтетика
+    с истиной, empty - кадры без объектов
+    """
+    profiler = Profiler(window=100000)
+    matcher = SiftMatcher(profiler=profiler, backend=create_backend(features, index=index))
+
+    started = time.perf_counter()
+    templates = [matcher.add_reference(image, name) for name, image in references]
+    prepare_ms = (time.perf_counter() - started) * 1000.0 / len(templates)
+
+    latencies, keypoints, inliers, errors = [], [], [], []
+    found = correct = 0
+    items = views if views is not None else [(frame, None, None) for frame in frames]
+    for frame, number, H in items:
+        t0 = time.perf_counter()
+        matches = matcher.match(frame)
+        latencies.append(time.perf_counter() - t0)
+        keypoints.append(len(matches.frame_kp or ()))
+
+        results = [r for r in matches.results if r.status == "found"]
+        if number is not None:
+            # Интересует только шаблон, который на кадре действительно есть
+            results = [r for r in results if r.template_id == templates[number].id]
+        if not results:
+            continue
+        found += 1
+        inliers.append(int(np.count_nonzero(results[0].inliers)))
+        if H is not None:
+            error = corner_error(templates[number], results[0].corners, H)
+            errors.append(error)
+            correct += error < CORRECT_ERROR
+
+    latencies_ms = np.array(latencies) * 1000.0
+    stages = profiler.summary()
+    result = {
+        "template_keypoints": float(np.mean([len(t.keypoints) for t in templates])),
+        "prepare_ms": prepare_ms,
+        "frame_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "frame_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "fps": len(latencies) / (latencies_ms.sum() / 1000.0),
+        "features_p50_ms": stages.get("features", {}).get("p50_ms"),
+        "knn_p50_ms": stages.get("knn_match", {}).get("p50_ms"),
+        "frame_keypoints": float(np.mean(keypoints)),
+        "found_rate": found / len(items),
+        "inliers_mean": float(np.mean(inliers)) if inliers else 0.0,
+    }
+    if views is not None:
+        result["correct_rate"] = correct / len(items)
+        result["corner_error_median_px"] = float(np.median(errors)) if errors else None
+    if empty:
+        # Задержки на пустых кадрах не учитываются: там нечего сопоставлять
+        false_hits = sum(any(r.status == "found" for r in matcher.match(frame).results) for frame in empty)
+        result["false_positive_rate"] = false_hits / len(empty)
+    return result
+
+
+def print_table(results):
+    print(f"{'детектор':<14}{'кадр p50':>10}{'к/с':>8}{'точек':>8}{'найдено':>9}{'верно':>8}"
+          f"{'ложные':>8}{'ошибка px':>11}{'инлайеры':>10}{'шаблон мс':>11}")
+    for name, r in results.items():
+        correct = f"{r['correct_rate'] * 100:.0f}%" if "correct_rate" in r else "-"
+        false_hits = f"{r['false_positive_rate'] * 100:.0f}%" if "false_positive_rate" in r else "-"
+        error = r.get("corner_error_median_px")
+        error = f"{error:.1f}" if error is not None else "-"
+        print(f"{name:<14}{r['frame_p50_ms']:>10.1f}{r['fps']:>8.1f}{r['frame_keypoints']:>8.0f}"
+              f"{r['found_rate'] * 100:>8.0f}%{correct:>8}{false_hits:>8}{error:>11}{r['inliers_mean']:>10.1f}"
+              f"{r['prepare_ms']:>11.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение детекторов точек по скорости и качеству")
+    parser.add_argument("templates", nargs="*", help="изображения-шаблоны (по умолчанию синтетический)")
+    parser.add_argument("--video", help="кадры из видео вместо синтетических ракурсов (без оценки точности)")
+    parser.add_argument("--frames", type=int, default=100, help="кадров из видео")
+    parser.add_argument("--views", type=int, default=20, help="синтетических ракурсов на шаблон")
+    parser.add_argument("--empty", type=int, default=20, help="кадров без объектов для доли ложных срабатываний")
+    parser.add_argument("--features", nargs="+", choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    parser.add_argument("--index", nargs="+", choices=("flann", "bf"), default=["flann"])
+    parser.add_argument("--threads", type=int, default=1, help="потоков OpenCV")
+    parser.add_argument("--json", metavar="PATH", help="сохранить результаты в файл")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(args.threads)
+    references = []
+    for path in args.templates:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            parser.error(f"не удалось прочитать {path}")
+        references.append((path, image))
+    if not references:
+        references = [("synthetic", synthetic_reference())]
+
+    frames = views = None
+    empty = empty_frames(args.empty)
+    if args.video:
+        frames = load_video(args.video, args.frames)
+    else:
+        # Ракурсы строятся по уже уменьшенным шаблонам - как их видит матчер
+        prepared = SiftMatcher()
+        views = synthetic_views([prepared.add_reference(image).image for _, image in references], args.views)
+
+    results = {}
+    for features in args.features:
+        for index in args.index:
+            name = features if len(args.index) == 1 else f"{features}/{index}"
+            results[name] = evaluate(features, index, references, frames, views, empty)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+
+class FpsMeter:
+    """Скользящая оценка частоты кадров по последним отметкам времени"""
+
+    def __init__(self, window=30):
+        self._ticks = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def tick(self):
+        with self._lock:
+            self._ticks.append(time.perf_counter())
+
+    @property
+    def fps(self):
+        with self._lock:
+            if len(self._ticks) < 2:
+                return 0.0
+            # Если стадия встала, последняя отметка "стареет" и FPS падает
+            span = max(self._ticks[-1], time.perf_counter() - 1.0) - self._ticks[0]
+            return (len(self._ticks) - 1) / span if span > 0 else 0.0
+
+
+class _StageTimer:
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Profiler:
+    """
+    Замер времени стадий обработки и счётчики.
+    По каждой стадии хранится скользящее окно последних замеров, из которого
+    считаются p50/p95/p99. Потокобезопасен: стадии конвейера пишут из своих потоков.
+
+        with profiler.stage("face_cascade"):
+            faces = cascade.detectMultiScale(gray)
+    """
+
+    def __init__(self, window=300, dump_path=None, dump_interval=10.0, enabled=True):
+        self.enabled = enabled
+        self.window = window
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals = defaultdict(int)  # Сколько раз стадия выполнялась за всё время
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+        self.frame_fps = FpsMeter()
+
+        self._last_dump = time.monotonic()
+        self._overlay_lines = []
+        self._overlay_updated = 0.0
+
+    def stage(self, name):
+        """Контекстный менеджер, замеряющий время стадии"""
+        if not self.enabled:
+            return nullcontext()
+        return _StageTimer(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples[name].append(seconds)
+            self._totals[name] += 1
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self._counters[name] += n
+
+    def frame_done(self):
+        """Отметка конца кадра: FPS и периодический сброс статистики в файл"""
+        if not self.enabled:
+            return
+        self.frame_fps.tick()
+        self.count("frames")
+        if self.dump_path and time.monotonic() - self._last_dump >= self.dump_interval:
+            self.dump()
+
+    def summary(self):
+        """{стадия: {count, mean_ms, p50_ms, p95_ms, p99_ms}} по скользящему окну"""
+        with self._lock:
+            samples = {name: np.array(values) * 1000.0 for name, values in self._samples.items() if values}
+            totals = dict(self._totals)
+
+        result = {}
+        for name, values in samples.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[name] = {"count": totals[name], "mean_ms": float(values.mean()),
+                            "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._counters.clear()
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def dump(self, path=None):
+        """
+        Сохраняет текущую статистику. В .csv строки дописываются в конец
+        (удобно строить графики), в .json файл перезаписывается снимком.
+        """
+        path = path or self.dump_path
+        self._last_dump = time.monotonic()
+        timestamp = time.time()
+        summary = self.summary()
+
+        if path.lower().endswith(".csv"):
+            is_new = not os.path.exists(path)
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(["timestamp", "stage", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+                for name, s in sorted(summary.items()):
+                    writer.writerow([f"{timestamp:.3f}", name, s["count"], f"{s['mean_ms']:.3f}",
+                                     f"{s['p50_ms']:.3f}", f"{s['p95_ms']:.3f}", f"{s['p99_ms']:.3f}"])
+        else:
+            snapshot = {"timestamp": timestamp, "fps": self.frame_fps.fps,
+                        "counters": self.counters(), "stages": summary}
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+
+    def overlay_lines(self, refresh=0.5):
+        """Строки для наложения на кадр; пересчитываются не чаще refresh секунд"""
+        now = time.monotonic()
+        if now - self._overlay_updated >= refresh:
+            self._overlay_updated = now
+            lines = [f"FPS {self.frame_fps.fps:.1f}"]
+            for name, s in self.summary().items():
+                lines.append(f"{name}: p50 {s['p50_ms']:.1f} p95 {s['p95_ms']:.1f} p99 {s['p99_ms']:.1f} ms")
+            self._overlay_lines = lines
+        return self._overlay_lines
+
+
+# Выключенный профайлер: значение по умолчанию, ничего не замеряет
+NULL_PROFILER = Profiler(enabled=False)
+
+
+def draw_overlay(image, profiler, origin=(8, 18), color=(255, 255, 0)):
+    """Рисует FPS и задержки стадий в левом верхнем углу изображения"""
+    x, y = origin
+    for line in profiler.overlay_lines():
+        # Тёмная подложка, чтобы текст читался на любом фоне
+        cv2.putText(image, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(image, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1, cv2.LINE_AA)
+        y += 16
+    return image
+
+
+def add_profiler_arguments(parser):
+    """Общие параметры профилирования для точек входа"""
+    parser.add_argument("--overlay", action="store_true", help="показывать FPS и задержки стадий поверх видео")
+    parser.add_argument("--profile-dump", metavar="PATH", default=None,
+                        help="периодически сохранять статистику стадий в .csv или .json")
+    parser.add_argument("--profile-interval", type=float, default=10.0, metavar="SEC",
+                        help="период сохранения статистики")
+
+
+def profiler_from_args(args):
+    """Профайлер включается, если нужен оверлей или файл статистики"""
+    if not (args.overlay or args.profile_dump):
+        return NULL_PROFILER
+    return Profiler(dump_path=args.profile_dump, dump_interval=args.profile_interval)
@@ -1,43 +1,75 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 import cv2
-import numpy as np
-from PIL import Image, ImageTk
+import argparse
 import os
+import time
+
+from descriptor_store import DEFAULT_STORE_DIR, DescriptorStore
+from display import CanvasView, FrameScheduler
+from feature_backends import add_backend_arguments, create_backend
+from instrumentation import NULL_PROFILER, add_profiler_arguments, draw_overlay, profiler_from_args
+from object_matcher import MatchRenderer, SiftMatcher
+from object_tracking import HomographyTracker
+
+# Режимы отрисовки в списке "Вид": подпись -> режим MatchRenderer
+VIEW_MODES = {
+    "Контур": "polygon",
+    "Контур и точки": "inliers",
+    "Линии совпадений": "matches",
+}
+
 
 class SiftMatcherApp:
-    def __init__(self, window, window_title):
+    def __init__(self, window, window_title, profiler=NULL_PROFILER, overlay=False, descriptor_store=None,
+                 track_every=0, matcher_options=None, view_mode="matches", status_interval=0.25):
         self.window = window
         self.window.title(window_title)
 
-        # --- Параметры SIFT и Матчинга ---
-        self.min_match_count = 10  # Минимум точек для отрисовки прямоугольника
-        # Инициализация SIFT
-        self.sift = cv2.SIFT_create()
-        
-        # Настройка FLANN для быстрого поиска совпадений
-        FLANN_INDEX_KDTREE = 1
-        index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
-        search_params = dict(checks=50)
-        self.flann = cv2.FlannBasedMatcher(index_params, search_params)
+        # Замер времени стадий и оверлей с FPS/задержками
+        self.profiler = profiler
+        self.overlay = overlay
+
+        # --- SIFT, общий FLANN-индекс и шаблоны живут в матчере, не зависящем от GUI ---
+        # Точки и дескрипторы шаблонов кэшируются на диске между запусками
+        self.matcher = SiftMatcher(min_match_count=10, profiler=profiler, store=descriptor_store,
+                                   **(matcher_options or {}))
+        # Режим слежения: полный поиск лишь раз в track_every кадров,
+        # между ними найденный объект ведётся оптическим потоком
+        self.tracker = self.matcher
+        if track_every > 0:
+            self.tracker = HomographyTracker(self.matcher, redetect_every=track_every)
+        # Результаты рисуются сразу в размере холста
+        self.renderer = MatchRenderer(self.matcher, view_mode)
+
+        # Статус найденного объекта обновляется не чаще status_interval секунд
+        self.status_interval = status_interval
+        self._status = None
+        self._status_time = 0.0
 
         # --- Переменные состояния ---
-        self.ref_image = None       # Исходное изображение (шаблон)
-        self.ref_kp = None          # Ключевые точки шаблона
-        self.ref_des = None         # Дескрипторы шаблона
-        
         self.cap = None             # Объект видеозахвата
         self.is_running = False     # Флаг работы видео
         self.video_source_type = None # 'cam' или 'file'
+        self.template_ids = []      # Номера шаблонов в порядке списка
 
         # --- Элементы GUI ---
         # Верхняя панель управления
         self.control_frame = tk.Frame(window)
         self.control_frame.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
 
-        self.btn_load_img = tk.Button(self.control_frame, text="1. Загрузить объект (Фото)", command=self.load_reference_image)
+        self.btn_load_img = tk.Button(self.control_frame, text="1. Добавить объект (Фото)", command=self.load_reference_image)
         self.btn_load_img.pack(side=tk.LEFT, padx=5)
 
+        # Список загруженных шаблонов и удаление выбранного
+        self.selected_template = tk.StringVar()
+        self.combo_templates = ttk.Combobox(self.control_frame, textvariable=self.selected_template,
+                                            state="readonly", width=18)
+        self.combo_templates.pack(side=tk.LEFT, padx=5)
+
+        self.btn_remove_img = tk.Button(self.control_frame, text="Удалить объект", command=self.remove_reference_image)
+        self.btn_remove_img.pack(side=tk.LEFT, padx=5)
+
         self.btn_load_video = tk.Button(self.control_frame, text="2. Выбрать Видео файл", command=self.open_video_file)
         self.btn_load_video.pack(side=tk.LEFT, padx=5)
 
@@ -47,6 +79,13 @@ class SiftMatcherApp:
         self.btn_stop = tk.Button(self.control_frame, text="Стоп", command=self.stop_video, bg="#ffcccc")
         self.btn_stop.pack(side=tk.LEFT, padx=5)
 
+        # Выбор вида: только контур дешевле всего
+        self.view_mode = tk.StringVar(value=next(k for k, v in VIEW_MODES.items() if v == view_mode))
+        self.combo_view = ttk.Combobox(self.control_frame, textvariable=self.view_mode, values=list(VIEW_MODES),
+                                       state="readonly", width=16)
+        self.combo_view.bind("<<ComboboxSelected>>", self.change_view_mode)
+        self.combo_view.pack(side=tk.LEFT, padx=5)
+
         self.lbl_status = tk.Label(self.control_frame, text="Ожидание загрузки...", fg="gray")
         self.lbl_status.pack(side=tk.RIGHT, padx=5)
 
@@ -56,36 +95,59 @@ class SiftMatcherApp:
         
         self.canvas = tk.Canvas(self.canvas_frame, bg="black", width=800, height=600)
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        # Один элемент холста и один PhotoImage, обновляемые на месте
+        self.view = CanvasView(self.canvas, anchor=tk.CENTER)
 
         # Обработка закрытия окна
         self.window.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        self.delay = 15 # Задержка между кадрами в мс
+        # Задержка между кадрами подстраивается под FPS источника и время обработки
+        self.scheduler = FrameScheduler()
         self.update()
 
     def load_reference_image(self):
-        """Загрузка статического изображения-шаблона"""
+        """Добавление статического изображения-шаблона в библиотеку"""
         path = filedialog.askopenfilename(filetypes=[("Image Files", "*.jpg *.jpeg *.png *.bmp")])
         if path:
-            img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-            if img is None:
+            # Вычисляем SIFT сразу при загрузке (огромный шаблон уменьшается),
+            # если этот файл уже встречался - берём готовое из кэша
+            template = self.matcher.add_reference_file(path)
+            if template is None:
                 messagebox.showerror("Ошибка", "Не удалось прочитать изображение")
                 return
+            if template.descriptors is None:
+                messagebox.showerror("Ошибка", "На изображении не найдено ключевых точек")
+                return
+            self.refresh_template_list(select=template)
             
-            # Для ускорения можно уменьшить шаблон, если он огромный
-            h, w = img.shape[:2]
-            if w > 500:
-                scale = 500 / w
-                img = cv2.resize(img, (int(w*scale), int(h*scale)))
-
-            self.ref_image = img
-            # Вычисляем SIFT сразу при загрузке
-            self.ref_kp, self.ref_des = self.sift.detectAndCompute(self.ref_image, None)
-            
-            self.lbl_status.config(text=f"Объект загружен: {len(self.ref_kp)} точек", fg="green")
+            self.set_status(f"Объект загружен: {len(template.keypoints)} точек "
+                                        f"(всего объектов: {len(self.matcher.templates)})", fg="green")
             
             # Показываем загруженное изображение на холсте, пока видео не запущено
-            self.show_static_preview(img)
+            self.show_static_preview(template.image)
+
+    def remove_reference_image(self):
+        """Удаление выбранного шаблона без перестройки всего индекса"""
+        index = self.combo_templates.current()
+        if index < 0:
+            return
+        template_id = self.template_ids[index]
+        name = self.matcher.templates[template_id].name
+        self.matcher.remove_reference(template_id)
+        self.refresh_template_list()
+        self.set_status(f"Объект удалён: {name}", fg="gray")
+
+    def refresh_template_list(self, select=None):
+        templates = list(self.matcher.templates.values())
+        # Одинаковые имена файлов различаем по номеру шаблона
+        self.template_ids = [t.id for t in templates]
+        self.combo_templates["values"] = [f"{t.id}. {t.name}" for t in templates]
+        if select is not None:
+            self.combo_templates.current(self.template_ids.index(select.id))
+        elif templates:
+            self.combo_templates.current(0)
+        else:
+            self.selected_template.set("")
 
     def show_static_preview(self, img_gray):
         """Отображение превью загруженного объекта"""
@@ -99,9 +161,10 @@ class SiftMatcherApp:
         if path:
             self.stop_video()
             self.cap = cv2.VideoCapture(path)
+            self.scheduler.set_fps(self.cap.get(cv2.CAP_PROP_FPS))
             self.is_running = True
             self.video_source_type = 'file'
-            self.lbl_status.config(text="Воспроизведение файла", fg="blue")
+            self.set_status("Воспроизведение файла", fg="blue")
 
     def start_camera(self):
         """Запуск веб-камеры"""
@@ -110,121 +173,100 @@ class SiftMatcherApp:
         if not self.cap.isOpened():
              messagebox.showerror("Ошибка", "Не удалось открыть камеру")
              return
+        self.scheduler.set_fps(self.cap.get(cv2.CAP_PROP_FPS))
         self.is_running = True
         self.video_source_type = 'cam'
-        self.lbl_status.config(text="Камера включена", fg="blue")
+        self.set_status("Камера включена", fg="blue")
 
     def stop_video(self):
         """Остановка видеопотока"""
         self.is_running = False
+        # Положения объектов относятся к прежнему видео
+        self.tracker.reset()
         if self.cap is not None:
             self.cap.release()
             self.cap = None
-        self.lbl_status.config(text="Остановлено", fg="black")
+        self.set_status("Остановлено", fg="black")
 
     def update(self):
         """Главный цикл обработки кадров"""
+        self.scheduler.begin()
         if self.is_running and self.cap is not None:
-            ret, frame = self.cap.read()
+            with self.profiler.stage("capture"):
+                ret, frame = self.cap.read()
             
             if ret:
                 # Если видеофайл закончился, можно пустить по кругу или остановить
                 # Здесь просто обрабатываем кадр
-                processed_image = self.process_frame(frame)
-                self.display_image(processed_image)
+                self.process_frame(frame)
+                self.profiler.frame_done()
             else:
                 # Конец видеофайла
                 if self.video_source_type == 'file':
                     self.stop_video()
                     messagebox.showinfo("Инфо", "Видео закончилось")
 
-        # Планируем следующий вызов через self.delay мс
-        self.window.after(self.delay, self.update)
+        # Планируем следующий вызов: с частотой источника, а без видео - редко
+        self.window.after(self.scheduler.next_delay(idle=not self.is_running), self.update)
 
     def process_frame(self, frame):
         """
-        Основная логика компьютерного зрения:
-        1. Найти точки на кадре.
-        2. Сопоставить с точками шаблона.
-        3. Найти гомографию и нарисовать прямоугольник.
-        4. Нарисовать линии совпадений.
+        Поиск шаблона на кадре (см. SiftMatcher.match), обновление статуса
+        и отрисовка найденного в выбранном виде сразу в размере холста.
         """
-        # Если шаблон не загружен, просто возвращаем кадр
-        if self.ref_image is None or self.ref_des is None:
-            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Конвертируем кадр в оттенки серого для SIFT
-        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Находим точки на текущем кадре
-        frame_kp, frame_des = self.sift.detectAndCompute(frame_gray, None)
-
-        # Если на кадре нет дескрипторов (темный экран и т.д.)
-        if frame_des is None:
-             return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Сопоставление (KNN Match)
-        matches = self.flann.knnMatch(self.ref_des, frame_des, k=2)
-
-        # Отбор хороших совпадений по тесту Лоу (Lowe's ratio test)
-        good_matches = []
-        for m, n in matches:
-            if m.distance < 0.7 * n.distance:
-                good_matches.append(m)
-
-        # Рисование прямоугольника обнаружения
-        detected_frame = frame.copy()
-        
-        if len(good_matches) >= self.min_match_count:
-            # Получаем координаты точек из совпадений
-            src_pts = np.float32([self.ref_kp[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-            dst_pts = np.float32([frame_kp[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-
-            # Находим матрицу гомографии
-            M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-            
-            if M is not None:
-                # Берем размеры исходного изображения-шаблона
-                h, w = self.ref_image.shape
-                # Определяем углы изображения-шаблона
-                pts = np.float32([[0, 0], [0, h - 1], [w - 1, h - 1], [w - 1, 0]]).reshape(-1, 1, 2)
-                # Трансформируем углы согласно найденной перспективе на новом кадре
-                dst = cv2.perspectiveTransform(pts, M)
-
-                # Рисуем зеленый многоугольник (прямоугольник) на кадре
-                # frame - это BGR изображение (стандарт OpenCV)
-                detected_frame = cv2.polylines(detected_frame, [np.int32(dst)], True, (0, 255, 0), 3, cv2.LINE_AA)
-                self.lbl_status.config(text=f"Объект найден! Совпадений: {len(good_matches)}", fg="green")
-            else:
-                 self.lbl_status.config(text=f"Не удалось построить проекцию. Совпадений: {len(good_matches)}", fg="orange")
+        matches = self.tracker.match(frame)
+        self.show_match_status(matches)
+        width, height = self.display_size()
+        image = self.renderer.render(frame, matches, (width, height))
+        self.show_image(image, is_bgr=True, overlay=self.overlay)
+
+    def change_view_mode(self, event=None):
+        self.renderer.mode = VIEW_MODES[self.view_mode.get()]
+
+    def set_status(self, text, fg, throttle=False):
+        """Текст статуса; с throttle - не чаще status_interval (статус каждого кадра)"""
+        now = time.monotonic()
+        if throttle and now - self._status_time < self.status_interval:
+            return
+        self._status_time = now
+        if (text, fg) != self._status:
+            self._status = (text, fg)
+            self.lbl_status.config(text=text, fg=fg)
+
+    def show_match_status(self, matches):
+        if matches.frame_kp is None:
+            return
+        found = [r for r in matches.results if r.status == "found"]
+        if len(found) > 1:
+            names = ", ".join(self.matcher.templates[r.template_id].name for r in found)
+            self.set_status(f"Найдено объектов: {len(found)} ({names})", fg="green", throttle=True)
+            return
+
+        # Один объект или ни одного: статус лучшего кандидата
+        result = found[0] if found else (matches.results[0] if matches.results else None)
+        count = len(result.ref_idx) if result is not None else 0
+        if result is not None and result.status == "found":
+            mode = " (слежение)" if matches.tracked else ""
+            self.set_status(f"Объект найден{mode}! Совпадений: {count}", fg="green", throttle=True)
+        elif result is not None and result.status == "no_homography":
+            self.set_status(f"Не удалось построить проекцию. Совпадений: {count}", fg="orange", throttle=True)
         else:
-            self.lbl_status.config(text=f"Мало совпадений: {len(good_matches)}/{self.min_match_count}", fg="red")
-
-        # Рисуем линии совпадений (Sided-by-side)
-        # drawMatches создает новое изображение: [Ref Image] [Video Frame]
-        img_matches = cv2.drawMatches(
-            self.ref_image, self.ref_kp, 
-            detected_frame, frame_kp, 
-            good_matches, None, 
-            flags=cv2.DrawMatchesFlags_NOT_DRAW_SINGLE_POINTS,
-            matchColor=(0, 255, 0), # Зеленые линии
-            singlePointColor=None
-        )
-
-        # Конвертация BGR -> RGB для Tkinter
-        img_rgb = cv2.cvtColor(img_matches, cv2.COLOR_BGR2RGB)
-        return img_rgb
-
-    def display_image(self, img_array):
-        """Конвертация numpy array в Tkinter Image и отрисовка"""
-        # Ресайз для отображения, если картинка слишком большая для окна
+            self.set_status(f"Мало совпадений: {count}/{self.matcher.min_match_count}", fg="red", throttle=True)
+
+    def display_size(self):
         display_width = self.canvas.winfo_width()
         display_height = self.canvas.winfo_height()
-        
+
         # Защита от нулевых размеров при инициализации
         if display_width < 10 or display_height < 10:
             display_width = 800
             display_height = 600
+        return display_width, display_height
+
+    def display_image(self, img_array, overlay=False):
+        """Конвертация numpy array (RGB) в Tkinter Image и отрисовка"""
+        # Ресайз для отображения, если картинка слишком большая для окна
+        display_width, display_height = self.display_size()
 
         h, w = img_array.shape[:2]
         
@@ -234,25 +276,59 @@ class SiftMatcherApp:
         # scale = min(scale, 1.0) 
         
         new_w, new_h = int(w * scale), int(h * scale)
-        if new_w > 0 and new_h > 0:
-            img_resized = cv2.resize(img_array, (new_w, new_h))
-        else:
-            img_resized = img_array
+        with self.profiler.stage("resize"):
+            if new_w > 0 and new_h > 0:
+                img_resized = self.view.resize(img_array, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+            else:
+                img_resized = img_array
 
-        image = Image.fromarray(img_resized)
-        self.photo = ImageTk.PhotoImage(image=image)
-        
-        # Очистка и отрисовка по центру
-        self.canvas.delete("all")
-        self.canvas.create_image(display_width//2, display_height//2, image=self.photo, anchor=tk.CENTER)
+        self.show_image(img_resized, is_bgr=False, overlay=overlay)
+
+    def show_image(self, image, is_bgr, overlay=False):
+        """Вывод уже подогнанного под холст изображения по центру"""
+        if overlay:
+            draw_overlay(image, self.profiler)
+
+        # Отрисовка по центру: тот же элемент холста, новые пиксели.
+        # BGR -> RGB делается здесь, одним проходом в переиспользуемый буфер
+        display_width, display_height = self.display_size()
+        with self.profiler.stage("tk_convert"):
+            self.view.show(image, (display_width//2, display_height//2), is_bgr=is_bgr)
 
     def on_close(self):
         self.stop_video()
+        if self.profiler.dump_path:
+            self.profiler.dump()
         self.window.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenCV SIFT Object Detector")
+    parser.add_argument("--track", type=int, default=0, metavar="N",
+                        help="полный поиск раз в N кадров, между ними слежение оптическим потоком (0 - выключено)")
+    parser.add_argument("--roi", type=float, default=None, metavar="PAD",
+                        help="искать точки только вокруг прошлого положения объекта, "
+                             "расширенного на долю PAD его размера")
+    parser.add_argument("--max-per-cell", type=int, default=None, metavar="N",
+                        help="не больше N точек кадра на клетку 64x64")
+    parser.add_argument("--cross-check", action="store_true",
+                        help="оставлять только взаимные совпадения кадра и шаблона")
+    parser.add_argument("--descriptor-cache", metavar="DIR", default=DEFAULT_STORE_DIR,
+                        help="каталог кэша точек и дескрипторов шаблонов")
+    parser.add_argument("--no-descriptor-cache", action="store_true", help="не использовать кэш дескрипторов")
+    parser.add_argument("--view", choices=MatchRenderer.MODES, default="matches",
+                        help="отрисовка: контур, контур и инлайеры или линии совпадений")
+    add_backend_arguments(parser)
+    add_profiler_arguments(parser)
+    args = parser.parse_args()
+
     root = tk.Tk()
     # Установка геометрии окна
     root.geometry("1000x700")
-    app = SiftMatcherApp(root, "OpenCV SIFT Object Detector")
+    store = None if args.no_descriptor_cache else DescriptorStore(args.descriptor_cache)
+    app = SiftMatcherApp(root, "OpenCV SIFT Object Detector",
+                         profiler=profiler_from_args(args), overlay=args.overlay, descriptor_store=store,
+                         track_every=args.track, view_mode=args.view,
+                         matcher_options=dict(roi_padding=args.roi, max_per_cell=args.max_per_cell,
+                                             cross_check=args.cross_check,
+                                             backend=create_backend(args.features, index=args.index)))
     root.mainloop()
\ No newline at end of file
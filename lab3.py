@@ -1,8 +1,24 @@
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, messagebox, ttk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import pytesseract
 import os
+import queue
+import functools
+
+import ocr
+from ocr_cache import OCRCache
+from ocr_regions import recognize_page
+from ocr_jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, OCRWorker
+
+# Job status as shown in the job list
+JOB_STATUS_TEXT = {
+    QUEUED: "в очереди",
+    RUNNING: "распознаётся",
+    DONE: "готово",
+    CANCELLED: "отменено",
+    FAILED: "ошибка",
+}
 
 class OCRApp:
     def __init__(self, root):
@@ -12,17 +28,24 @@ class OCRApp:
         self.root.configure(bg="#f0f0f0")
         
         self.image_path = None
-        self.original_image = None
+        self.image_source = None  # Full resolution file for OCR; the preview is a separate copy
+
+        # Re-extracting an image, also after switching languages back and forth, comes from the cache
+        try:
+            self.cache = OCRCache()
+        except OSError:
+            self.cache = None  # No writable cache directory; recognize every time
+
+        # OCR runs on a background worker; the UI polls it for job updates. Region
+        # jobs recognize as many tiles at once as Tesseract's OpenMP threads leave
+        # CPUs for (ocr_regions.default_tile_workers)
+        self.worker = OCRWorker(recognize=functools.partial(recognize_page, cache=self.cache))
+        self.worker.start()
+        self.job_ids = []  # Job ids in job list order
+        self.shown_job = None  # Job whose text is in the text area
         
-        # Language mapping for Tesseract
-        self.languages = {
-            "English": "eng",
-            "Russian": "rus",
-            "Japanese": "jpn",
-            "English + Russian": "eng+rus",
-            "English + Japanese": "eng+jpn",
-            "All Three": "eng+rus+jpn"
-        }
+        # Language mapping for Tesseract (shared with batch_ocr.py)
+        self.languages = ocr.LANGUAGES
         self.selected_language = tk.StringVar(value="English")
         
         # Title
@@ -73,6 +96,32 @@ class OCRApp:
             width=20
         )
         lang_combo.pack(side=tk.LEFT)
+
+        # Preprocessing: text regions are recognized as separate tiles in parallel
+        options_frame = tk.Frame(root, bg="#f0f0f0")
+        options_frame.pack(pady=(0, 10))
+
+        self.option_vars = {
+            "regions": tk.BooleanVar(value=False),
+            "binarize": tk.BooleanVar(value=False),
+            "deskew": tk.BooleanVar(value=False),
+            "dpi": tk.BooleanVar(value=False),
+        }
+        option_labels = {
+            "regions": "Поиск областей текста",
+            "binarize": "Бинаризация",
+            "deskew": "Выравнивание наклона",
+            "dpi": "Привести к 300 DPI",
+        }
+        for key, text in option_labels.items():
+            tk.Checkbutton(
+                options_frame,
+                text=text,
+                variable=self.option_vars[key],
+                font=("Arial", 10),
+                bg="#f0f0f0",
+                fg="#333"
+            ).pack(side=tk.LEFT, padx=5)
         
         # Frame for image and text
         content_frame = tk.Frame(root, bg="#f0f0f0")
@@ -139,6 +188,36 @@ class OCRApp:
         )
         extract_btn.pack(pady=10)
         self.extract_btn = extract_btn
+
+        # Job queue: pick a job to see its text, cancel it, watch progress
+        jobs_frame = tk.Frame(root, bg="#f0f0f0")
+        jobs_frame.pack(pady=5)
+
+        self.selected_job = tk.StringVar()
+        self.job_combo = ttk.Combobox(
+            jobs_frame,
+            textvariable=self.selected_job,
+            state="readonly",
+            font=("Arial", 10),
+            width=45
+        )
+        self.job_combo.bind("<<ComboboxSelected>>", self.show_selected_job)
+        self.job_combo.pack(side=tk.LEFT, padx=(0, 10))
+
+        cancel_btn = tk.Button(
+            jobs_frame,
+            text="✖ Отмена",
+            command=self.cancel_job,
+            font=("Arial", 10),
+            bg="white",
+            fg="black",
+            cursor="hand2"
+        )
+        cancel_btn.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.progress = ttk.Progressbar(jobs_frame, mode="indeterminate", length=150)
+        self.progress.pack(side=tk.LEFT)
+        self.progress_running = False
         
         # Status label
         self.status_label = tk.Label(
@@ -149,6 +228,8 @@ class OCRApp:
             fg="#666"
         )
         self.status_label.pack(pady=5)
+
+        self.root.after(100, self.poll_jobs)
     
     def upload_image(self):
         file_path = filedialog.askopenfilename(
@@ -162,10 +243,10 @@ class OCRApp:
         if file_path:
             try:
                 self.image_path = file_path
-                self.original_image = Image.open(file_path)
-                
-                # Display image
-                self.display_image(self.original_image)
+                self.image_source = ocr.ImageSource(file_path)
+
+                # Display a quickly decoded preview; OCR decodes the full image later
+                self.display_image(self.image_source)
                 
                 # Enable extract button
                 self.extract_btn.config(state=tk.NORMAL)
@@ -176,11 +257,11 @@ class OCRApp:
             except Exception as e:
                 messagebox.showerror("Error", f"Не удалось загрузить пикчу:\n{str(e)}")
     
-    def display_image(self, image):
-        # Resize image to fit the label
+    def display_image(self, source):
+        # Preview is a separate downscaled copy; the full image is left for OCR
         display_size = (350, 400)
-        image.thumbnail(display_size, Image.Resampling.LANCZOS)
-        
+        image = source.preview(display_size)
+
         photo = ImageTk.PhotoImage(image)
         self.image_label.config(image=photo, text="")
         self.image_label.image = photo
@@ -189,37 +270,106 @@ class OCRApp:
         if not self.image_path:
             messagebox.showwarning("Warning", "Сначала пикча, потом букавы!")
             return
-        
-        try:
-            self.status_label.config(text="Извлекаю...")
-            self.root.update()
-            
-            # Get selected language code
-            lang_name = self.selected_language.get()
-            lang_code = self.languages[lang_name]
-            
-            # Perform OCR with selected language
-            text = pytesseract.image_to_string(self.original_image, lang=lang_code)
-            
-            # Display extracted text
-            self.text_area.delete(1.0, tk.END)
-            if text.strip():
-                self.text_area.insert(tk.END, text)
-                self.status_label.config(text=f"Готово! (Язык: {lang_name})")
-            else:
-                self.text_area.insert(tk.END, "No text found in the image.")
-                self.status_label.config(text="No text detected")
-                
-        except pytesseract.TesseractNotFoundError:
+
+        # Get selected language code
+        lang_name = self.selected_language.get()
+        lang_code = self.languages[lang_name]
+
+        options = {key: var.get() for key, var in self.option_vars.items()}
+        options["dpi"] = 300 if options["dpi"] else None
+
+        # Queue OCR with selected language; the window stays responsive meanwhile
+        job = self.worker.submit(self.image_source, lang_code, name=os.path.basename(self.image_path),
+                                 options=options)
+        self.shown_job = job.id
+        self.text_area.delete(1.0, tk.END)
+        self.status_label.config(text=f"В очереди: {job.name} (Язык: {lang_name})")
+
+    def cancel_job(self):
+        """Cancel the job selected in the job list, or else the running one"""
+        job = self.selected_job_object() or self.worker.active
+        if job is not None and self.worker.cancel(job):
+            self.status_label.config(text=f"Отменено: {job.name}")
+
+    def selected_job_object(self):
+        index = self.job_combo.current()
+        if index < 0:
+            return None
+        job_id = self.job_ids[index]
+        return next(job for job in self.worker.jobs if job.id == job_id)
+
+    def show_selected_job(self, event=None):
+        job = self.selected_job_object()
+        if job is None:
+            return
+        self.shown_job = job.id
+        self.show_job_text(job)
+
+    def poll_jobs(self):
+        """Apply job updates from the worker on the Tk thread"""
+        changed = []
+        while True:
+            try:
+                changed.append(self.worker.events.get_nowait())
+            except queue.Empty:
+                break
+
+        if changed:
+            self.refresh_job_list()
+            for job in changed:
+                self.on_job_update(job)
+
+        # Spinner runs while Tesseract is busy, even with a cancelled job
+        busy = self.worker.active is not None
+        if busy and not self.progress_running:
+            self.progress.start(15)
+        elif not busy and self.progress_running:
+            self.progress.stop()
+        self.progress_running = busy
+        self.root.after(100, self.poll_jobs)
+
+    def refresh_job_list(self):
+        jobs = self.worker.jobs
+        self.job_ids = [job.id for job in jobs]
+        self.job_combo["values"] = [
+            f"{job.id}. {job.name} [{job.lang_code}] - {JOB_STATUS_TEXT[job.status]}" for job in jobs
+        ]
+        if self.shown_job in self.job_ids:
+            self.job_combo.current(self.job_ids.index(self.shown_job))
+
+    def on_job_update(self, job):
+        pending = len(self.worker.pending)
+        queued = f" (в очереди ещё {pending - 1})" if pending > 1 else ""
+        if job.status == RUNNING:
+            self.status_label.config(text=f"Извлекаю: {job.name}{queued}")
+        elif job.status == DONE:
+            self.status_label.config(text=f"Готово: {job.name} за {job.elapsed:.1f} с (Язык: {job.lang_code}){queued}")
+        elif job.status == FAILED:
+            self.show_job_error(job)
+        if job.id == self.shown_job and job.is_finished:
+            self.show_job_text(job)
+
+    def show_job_text(self, job):
+        self.text_area.delete(1.0, tk.END)
+        if job.status != DONE:
+            return
+        if job.text.strip():
+            self.text_area.insert(tk.END, job.text)
+        else:
+            self.text_area.insert(tk.END, "No text found in the image.")
+            self.status_label.config(text="No text detected")
+
+    def show_job_error(self, job):
+        if isinstance(job.error, pytesseract.TesseractNotFoundError):
             messagebox.showerror("Error", "Tesseract is not installed or not in PATH.\nPlease install Tesseract OCR.")
             self.status_label.config(text="Tesseract not found")
-        except Exception as e:
-            error_msg = str(e)
-            if "failed loading language" in error_msg.lower():
-                messagebox.showerror("Error", f"Language data not installed.\nPlease install Tesseract language data for: {lang_name}\n\nError: {error_msg}")
-            else:
-                messagebox.showerror("Error", f"Failed to extract text:\n{error_msg}")
-            self.status_label.config(text="Extraction failed")
+            return
+        error_msg = str(job.error)
+        if "failed loading language" in error_msg.lower():
+            messagebox.showerror("Error", f"Language data not installed.\nPlease install Tesseract language data for: {job.lang_code}\n\nError: {error_msg}")
+        else:
+            messagebox.showerror("Error", f"Failed to extract text:\n{error_msg}")
+        self.status_label.config(text="Extraction failed")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,23 +1,36 @@
 import cv2
 import tkinter as tk
 from tkinter import messagebox
-from PIL import Image, ImageTk
-import os
+import argparse
+
+from display import CanvasView, FrameScheduler
+from face_detector import FaceEyeDetector, add_detector_arguments, detector_options, draw_detections
+from instrumentation import NULL_PROFILER, add_profiler_arguments, draw_overlay, profiler_from_args
+from pipeline import FramePipeline
+from screenshots import ScreenshotWriter
+from tracking import FaceTracker
 
 class FaceEyeDetectorApp:
-    def __init__(self, window, window_title):
+    def __init__(self, window, window_title, pipeline=False, track_every=0, detector_options=None,
+                 screenshot_options=None, burst_size=10, profiler=NULL_PROFILER, overlay=False):
         self.window = window
         self.window.title(window_title)
-        
+
         # Задаём начальный размер окна
         self.window_width = 640
-        self.window_height = 540
+        self.window_height = 560
         self.window.geometry(f"{self.window_width}x{self.window_height}")
-        self.window.resizable(False, False) 
+        self.window.resizable(False, False)
+
+        # Замер времени стадий и оверлей с FPS/задержками
+        self.profiler = profiler
+        self.overlay = overlay
 
         # Загружаем Haar-каскады
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye_tree_eyeglasses.xml')
+        self.detector = FaceEyeDetector(profiler=profiler, **(detector_options or {}))
+        # Режим слежения: полная детекция лишь раз в track_every кадров
+        if track_every > 0:
+            self.detector = FaceTracker(self.detector, detect_every=track_every)
 
         # Открываем веб-камеру
         self.vid = cv2.VideoCapture(0)
@@ -28,72 +41,153 @@ class FaceEyeDetectorApp:
         # Canvas для отображения видео
         self.canvas = tk.Canvas(window, width=self.window_width, height=480, bg="black")
         self.canvas.pack(pady=5)
+        # Один элемент холста и один буфер на всё время работы
+        self.view = CanvasView(self.canvas)
 
-        # Кнопки "Сделать скриншот" и "Выход"
+        # Кнопки "Сделать скриншот", "Серия", "Непрерывно" и "Выход"
         btn_frame = tk.Frame(window)
         btn_frame.pack(pady=5)
 
-        self.btn_screenshot = tk.Button(btn_frame, text="Сделать скриншот", width=20, command=self.screenshot)
-        self.btn_screenshot.pack(side=tk.LEFT, padx=10)
-
-        self.btn_exit = tk.Button(btn_frame, text="Выход", width=15, command=self.exit_app)
-        self.btn_exit.pack(side=tk.LEFT, padx=10)
-
-        self.delay = 15
-        self.update()
+        self.btn_screenshot = tk.Button(btn_frame, text="Сделать скриншот", width=16, command=self.screenshot)
+        self.btn_screenshot.pack(side=tk.LEFT, padx=5)
+
+        self.btn_burst = tk.Button(btn_frame, text=f"Серия ({burst_size})", width=10, command=self.burst)
+        self.btn_burst.pack(side=tk.LEFT, padx=5)
+
+        self.btn_continuous = tk.Button(btn_frame, text="Непрерывно", width=10, command=self.toggle_continuous)
+        self.btn_continuous.pack(side=tk.LEFT, padx=5)
+
+        self.btn_exit = tk.Button(btn_frame, text="Выход", width=10, command=self.exit_app)
+        self.btn_exit.pack(side=tk.LEFT, padx=5)
+
+        # Строка состояния: сохранённые скриншоты и FPS конвейера
+        info_frame = tk.Frame(window)
+        info_frame.pack(fill=tk.X, padx=5)
+        self.lbl_saved = tk.Label(info_frame, text="", fg="gray")
+        self.lbl_saved.pack(side=tk.LEFT)
+        self.lbl_fps = tk.Label(info_frame, text="", fg="gray")
+        self.lbl_fps.pack(side=tk.RIGHT)
+
+        # Скриншоты пишутся в фоне из последнего показанного кадра
+        self.writer = ScreenshotWriter(**(screenshot_options or {}))
+        self.writer.start()
+        self.last_frame = None
+        self.last_detections = []
+        self.burst_size = burst_size
+        self.burst_left = 0
+        self.continuous = False
+
+        # Темп опроса подстраивается под камеру и время обработки
+        self.scheduler = FrameScheduler(self.vid.get(cv2.CAP_PROP_FPS))
+
+        # Конвейерный режим: захват и детекция в отдельных потоках
+        self.pipeline = None
+        if pipeline:
+            self.pipeline = FramePipeline(self.vid, self.detector, profiler)
+            self.pipeline.start()
+            self.update_pipeline()
+        else:
+            self.update()
 
         self.window.mainloop()
 
     def update(self):
-        ret, frame = self.vid.read()
+        self.scheduler.begin()
+        with self.profiler.stage("capture"):
+            ret, frame = self.vid.read()
         if ret:
             # Обнаружение лиц и глаз
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=5)
+            self.show_frame(frame, self.detector.detect(frame))
+
+        self.update_status()
+        self.window.after(self.scheduler.next_delay(idle=not ret), self.update)
+
+    def update_pipeline(self):
+        self.scheduler.begin()
+        item = self.pipeline.next_display_frame()
+        self.lbl_fps.config(text=self.pipeline.format_stats())
+        self.update_status()
+        if item is None:
+            self.window.after(self.scheduler.poll_delay(), self.update_pipeline)
+            return
+
+        # Рамки могут отставать на кадр-другой, зато видео не тормозит
+        self.show_frame(*item)
+        self.pipeline.display_fps.tick()
+        self.window.after(self.scheduler.next_delay(), self.update_pipeline)
+
+    def show_frame(self, frame, detections):
+        # Исходный кадр не трогаем: он нужен для скриншотов, а в конвейере его читает детектор
+        self.last_frame = frame
+        self.last_detections = detections
+
+        # Масштабируем кадр под размер полотна и рисуем разметку уже в буфере отображения
+        with self.profiler.stage("resize"):
+            frame_resized = self.view.resize(frame, (self.window_width, 480))
+        # Камера может не выдать 4:3, тогда кадр сжат по осям по-разному
+        scale = (frame_resized.shape[1] / frame.shape[1], frame_resized.shape[0] / frame.shape[0])
+        draw_detections(frame_resized, detections, scale=scale)
+        if self.overlay:
+            draw_overlay(frame_resized, self.profiler)
+        with self.profiler.stage("tk_convert"):
+            self.view.show(frame_resized)
+        self.profiler.frame_done()
+
+        # Серия и непрерывная съёмка сохраняют каждый показанный кадр
+        if self.continuous or self.burst_left > 0:
+            self.burst_left = max(0, self.burst_left - 1)
+            self.writer.submit(frame, detections)
+
+    def update_status(self):
+        if self.writer.last_error:
+            self.lbl_saved.config(text=f"Ошибка записи: {self.writer.last_error}", fg="red")
+        elif self.writer.last_saved:
+            text = f"Сохранён {self.writer.last_saved} (всего {self.writer.saved})"
+            if self.writer.dropped:
+                text += f", пропущено {self.writer.dropped}"
+            self.lbl_saved.config(text=text, fg="gray")
 
-            for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                roi_gray = gray[y:y+h, x:x+w]
-                roi_color = frame[y:y+h, x:x+w]
-                eyes = self.eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=10)
-                for (ex, ey, ew, eh) in eyes:
-                    cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
-
-            # Масштабируем кадр под размер полотна
-            frame_resized = cv2.resize(frame, (self.window_width, 480), interpolation=cv2.INTER_AREA)
-
-            self.photo = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)))
-            self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
+    def screenshot(self):
+        # Сохраняем ровно то, что видел пользователь, без повторной детекции
+        if self.last_frame is not None:
+            filename = self.writer.submit(self.last_frame, self.last_detections)
+            if filename:
+                self.lbl_saved.config(text=f"Сохраняется {filename}...", fg="gray")
 
-        self.window.after(self.delay, self.update)
+    def burst(self):
+        self.burst_left = self.burst_size
 
-    def screenshot(self):
-        ret, frame = self.vid.read()
-        if ret:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-
-            for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                roi_gray = gray[y:y+h, x:x+w]
-                roi_color = frame[y:y+h, x:x+w]
-                eyes = self.eye_cascade.detectMultiScale(roi_gray, 1.1, 10)
-                for (ex, ey, ew, eh) in eyes:
-                    cv2.rectangle(roi_color, (ex, ey), (ex+ew, ey+eh), (0, 255, 0), 2)
-
-            filename = "screenshot.png"
-            i = 1
-            while os.path.exists(filename):
-                filename = f"screenshot_{i}.png"
-                i += 1
-            cv2.imwrite(filename, frame)
-            messagebox.showinfo("Скриншот", f"Сохранён как {filename}")
+    def toggle_continuous(self):
+        self.continuous = not self.continuous
+        self.btn_continuous.config(relief=tk.SUNKEN if self.continuous else tk.RAISED)
 
     def exit_app(self):
         if messagebox.askokcancel("Выход", "Закрыть приложение?"):
+            if self.pipeline is not None:
+                self.pipeline.stop()
+            self.writer.close()
+            if self.profiler.dump_path:
+                self.profiler.dump()
             self.vid.release()
             self.window.destroy()
 
 
 if __name__ == "__main__":
-    FaceEyeDetectorApp(tk.Tk(), "Детектор лиц и глаз")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Детектор лиц и глаз")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="захват, детекция и отображение в отдельных потоках")
+    parser.add_argument("--track", type=int, default=0, metavar="N",
+                        help="полный поиск лиц раз в N кадров, между ними слежение (0 - выключено)")
+    parser.add_argument("--burst", type=int, default=10, metavar="N", help="кадров в серии скриншотов")
+    parser.add_argument("--screenshot-dir", default=".", help="каталог для скриншотов")
+    parser.add_argument("--save-raw", action="store_true", help="сохранять рядом кадр без разметки")
+    parser.add_argument("--save-metadata", action="store_true", help="сохранять рядом JSON с найденными лицами")
+    add_detector_arguments(parser)
+    add_profiler_arguments(parser)
+    args = parser.parse_args()
+
+    screenshot_options = dict(directory=args.screenshot_dir, save_raw=args.save_raw,
+                              save_metadata=args.save_metadata)
+    FaceEyeDetectorApp(tk.Tk(), "Детектор лиц и глаз", pipeline=args.pipeline, track_every=args.track,
+                       detector_options=detector_options(args), screenshot_options=screenshot_options,
+                       burst_size=args.burst, profiler=profiler_from_args(args), overlay=args.overlay)
@@ -0,0 +1,638 @@
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from descriptor_store import array_to_keypoints, keypoints_to_array
+from feature_backends import FeatureBackend, create_backend
+from instrumentation import NULL_PROFILER
+
+# Результат поиска одного шаблона на кадре.
+# status: "found", "no_homography", "few_matches"
+# ref_idx/frame_idx - номера точек шаблона и кадра в хороших совпадениях,
+# inliers - маска совпадений, согласных с гомографией
+MatchResult = namedtuple(
+    "MatchResult", ["template_id", "status", "ref_idx", "frame_idx", "homography", "corners", "inliers"],
+    defaults=[None, None, None])
+
+# Всё найденное на кадре: точки кадра и результаты по шаблонам (лучшие первыми).
+# frame_points - координаты frame_kp массивом (N, 2), tracked - результат
+# получен слежением, а не полным поиском
+FrameMatches = namedtuple("FrameMatches", ["frame_kp", "results", "tracked", "frame_points"],
+                          defaults=[None, (), False, None])
+
+
+class Template:
+    """Шаблон: изображение, его точки и дескрипторы"""
+
+    def __init__(self, template_id, name, image, keypoints, descriptors, points=None):
+        self.id = template_id
+        self.name = name
+        self.image = image
+        self.keypoints = keypoints
+        self.descriptors = descriptors
+        # Координаты точек массивом, чтобы не ходить по KeyPoint в цикле.
+        # Массив из DescriptorStore не копируется и остаётся отображением файла
+        if points is None:
+            points = np.float32([kp.pt for kp in keypoints])
+        self.points = np.asarray(points, np.float32).reshape(-1, 2)
+
+
+def project_corners(template, homography):
+    """Углы шаблона, перенесённые гомографией на кадр, форма (4, 1, 2)"""
+    # Берем размеры исходного изображения-шаблона
+    h, w = template.image.shape
+    # Определяем углы изображения-шаблона
+    pts = np.float32([[0, 0], [0, h - 1], [w - 1, h - 1], [w - 1, 0]]).reshape(-1, 1, 2)
+    # Трансформируем углы согласно найденной перспективе на новом кадре
+    return cv2.perspectiveTransform(pts, homography)
+
+
+def match_to_dict(result, templates):
+    """Результат по шаблону в виде, пригодном для JSON"""
+    corners = None
+    if result.corners is not None:
+        corners = np.round(result.corners.reshape(-1, 2).astype(float), 1).tolist()
+    return {
+        "template": int(result.template_id),
+        "name": templates[result.template_id].name if result.template_id in templates else None,
+        "status": result.status,
+        "matches": len(result.ref_idx),
+        "inliers": int(np.count_nonzero(result.inliers)) if result.inliers is not None else 0,
+        "corners": corners,
+    }
+
+
+def draw_object(image, corners, label=None, color=(0, 255, 0)):
+    """Многоугольник найденного объекта и подпись над ним"""
+    corners = np.int32(corners).reshape(-1, 1, 2)
+    cv2.polylines(image, [corners], True, color, 3, cv2.LINE_AA)
+    if label:
+        x, y = corners.reshape(-1, 2).min(axis=0)
+        cv2.putText(image, label, (int(x), max(int(y) - 8, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2, cv2.LINE_AA)
+    return image
+
+
+class _IndexSegment:
+    """Индекс (FLANN или перебор) над дескрипторами нескольких шаблонов"""
+
+    def __init__(self, templates, backend):
+        self.template_ids = {t.id for t in templates}
+        self.descriptors = np.concatenate([t.descriptors for t in templates])
+        # Для каждой строки индекса: чей это дескриптор и его номер внутри шаблона
+        self.owners = np.concatenate([np.full(len(t.descriptors), t.id, np.int32) for t in templates])
+        self.local_idx = np.concatenate([np.arange(len(t.descriptors), dtype=np.int32) for t in templates])
+        self.index = backend.build_index(self.descriptors)
+
+    def __len__(self):
+        return len(self.descriptors)
+
+    def search(self, query, k):
+        k = min(k, len(self))
+        idx, dist = self.index.knn(query, k)
+        # LSH может не найти соседей в своих корзинах и вернуть -1
+        missing = idx < 0
+        idx = np.where(missing, 0, idx)
+        dist = dist.astype(np.float32)
+        dist[missing] = np.inf
+        return self.owners[idx], self.local_idx[idx], dist
+
+
+class TemplateIndex:
+    """
+    Один общий FLANN-индекс по дескрипторам всех шаблонов.
+
+    Чтобы добавление и удаление не перестраивали всё, индекс состоит из
+    основного сегмента и небольшого "дельта"-сегмента для недавно
+    добавленных шаблонов. Удалённые шаблоны только помечаются и
+    отфильтровываются при поиске. Когда дельта или число помеченных
+    дескрипторов становятся заметной долей основного сегмента, всё
+    сливается в новый основной сегмент.
+    """
+
+    def __init__(self, backend, delta_fraction=0.25, removed_fraction=0.25):
+        self.backend = backend
+        self.delta_fraction = delta_fraction
+        self.removed_fraction = removed_fraction
+
+        self.templates = {}
+        self._main = None
+        self._delta = None
+        self._removed = set()
+        self._removed_count = 0
+
+    def __len__(self):
+        return len(self.templates)
+
+    def add(self, template):
+        self.templates[template.id] = template
+        delta_templates = [self.templates[i] for i in (self._delta.template_ids if self._delta else ())
+                           if i in self.templates]
+        delta_templates.append(template)
+        delta_size = sum(len(t.descriptors) for t in delta_templates)
+        main_size = len(self._main) if self._main else 0
+
+        if delta_size > self.delta_fraction * main_size:
+            self._rebuild()
+        else:
+            # Перестраивается только маленькая дельта
+            self._delta = _IndexSegment(delta_templates, self.backend)
+
+    def remove(self, template_id):
+        template = self.templates.pop(template_id, None)
+        if template is None:
+            return
+        if self._delta and template_id in self._delta.template_ids:
+            rest = [self.templates[i] for i in self._delta.template_ids if i in self.templates]
+            self._delta = _IndexSegment(rest, self.backend) if rest else None
+            return
+
+        self._removed.add(template_id)
+        self._removed_count += len(template.descriptors)
+        if self._removed_count > self.removed_fraction * len(self._main):
+            self._rebuild()
+
+    def _rebuild(self):
+        templates = list(self.templates.values())
+        self._main = _IndexSegment(templates, self.backend) if templates else None
+        self._delta = None
+        self._removed.clear()
+        self._removed_count = 0
+
+    def search(self, query, k=2):
+        """
+        k ближайших дескрипторов шаблонов для каждой строки query.
+        Возвращает (владельцы, номера внутри шаблона, квадраты расстояний),
+        все формы (N, k); недостающие соседи имеют расстояние inf.
+        """
+        segments = [s for s in (self._main, self._delta) if s is not None]
+        owners, local, dist = zip(*(self._search_segment(s, query, k) for s in segments))
+        owners, local, dist = np.hstack(owners), np.hstack(local), np.hstack(dist)
+
+        if dist.shape[1] < k:
+            pad = k - dist.shape[1]
+            owners = np.pad(owners, ((0, 0), (0, pad)), constant_values=-1)
+            local = np.pad(local, ((0, 0), (0, pad)), constant_values=-1)
+            dist = np.pad(dist, ((0, 0), (0, pad)), constant_values=np.inf)
+
+        order = np.argsort(dist, axis=1)[:, :k]
+        return (np.take_along_axis(owners, order, axis=1), np.take_along_axis(local, order, axis=1),
+                np.take_along_axis(dist, order, axis=1))
+
+    def _search_segment(self, segment, query, k):
+        """k ближайших соседей в сегменте без учёта удалённых шаблонов"""
+        if segment is not self._main or not self._removed:
+            return segment.search(query, k)
+
+        removed = list(self._removed)
+        owners, local, dist = segment.search(query, k + 2)
+        masked = np.isin(owners, removed)
+        dist[masked] = np.inf
+        # Если помеченные соседи вытеснили живых, вторым соседом оказался бы
+        # inf или более далёкий дескриптор, чем в заново построенном индексе.
+        # Такие строки ищутся заново на глубину, в которую гарантированно
+        # помещаются k живых соседей
+        short = np.flatnonzero(masked.any(axis=1) & (np.isfinite(dist).sum(axis=1) < k))
+        if len(short):
+            deep = segment.search(query[short], k + self._removed_count)
+            deep[2][np.isin(deep[0], removed)] = np.inf
+            order = np.argsort(deep[2], axis=1)[:, :dist.shape[1]]
+            for full, part in zip((owners, local, dist), deep):
+                full[short] = np.take_along_axis(part, order, axis=1)
+        return owners, local, dist
+
+
+class SiftMatcher:
+    """
+    Поиск объектов-шаблонов на кадре: точки (SIFT или бинарные ORB/AKAZE/BRISK,
+    см. feature_backends) + общий индекс дескрипторов + гомография.
+    Дескрипторы кадра запрашиваются в индексе один раз, голоса группируются
+    по шаблонам, и гомография строится только для шаблонов с достаточной
+    поддержкой. Не зависит от GUI, поэтому используется и окном
+    SiftMatcherApp, и консольными инструментами.
+    """
+
+    def __init__(self, min_match_count=10, max_reference_width=500, ratio=0.7, profiler=NULL_PROFILER,
+                 store=None, roi_padding=None, roi_refresh=30, cell_size=64, max_per_cell=None, backend="sift",
+                 cross_check=False):
+        self.min_match_count = min_match_count  # Минимум точек для отрисовки прямоугольника
+        self.max_reference_width = max_reference_width
+        self.ratio = ratio  # Порог теста Лоу
+        # Оставлять только взаимные совпадения (кадр -> шаблон и шаблон -> кадр)
+        self.cross_check = cross_check
+        self.profiler = profiler
+
+        # Поиск в области интереса: точки кадра ищутся только вокруг прошлого
+        # положения найденных объектов, расширенного на roi_padding их размера
+        # и на сдвиг за последний кадр. None - всегда весь кадр. Раз в
+        # roi_refresh кадров кадр просматривается целиком, чтобы заметить новые объекты
+        self.roi_padding = roi_padding
+        self.roi_refresh = roi_refresh
+        self._known = {}  # template_id -> (углы на последнем кадре, углы на предыдущем)
+        self._since_full = 0
+
+        # Не больше max_per_cell самых сильных точек в каждой клетке cell_size x cell_size,
+        # чтобы на пёстрых сценах число дескрипторов и стоимость FLANN оставались ограничены
+        self.cell_size = cell_size
+        self.max_per_cell = max_per_cell
+
+        # Детектор точек (SIFT по умолчанию, либо ORB/AKAZE/BRISK) и способ их сопоставления
+        if not isinstance(backend, FeatureBackend):
+            backend = create_backend(backend)
+        self.backend = backend
+        self.detector = backend.detector
+
+        # Дескрипторы всех шаблонов в одном индексе
+        self.index = TemplateIndex(backend)
+        self._next_id = 1
+
+        # Кэш точек и дескрипторов шаблонов на диске (DescriptorStore или None)
+        self.store = store
+
+    @property
+    def templates(self):
+        return self.index.templates
+
+    def feature_params(self):
+        """Всё, от чего зависят точки шаблона: часть ключа кэша дескрипторов"""
+        params = self.backend.params()
+        params["max_reference_width"] = self.max_reference_width
+        params["opencv"] = ".".join(cv2.__version__.split(".")[:2])
+        return params
+
+    def add_reference(self, img_gray, name=None):
+        """Добавляет шаблон (оттенки серого), сразу считает его SIFT; возвращает Template"""
+        # Для ускорения можно уменьшить шаблон, если он огромный
+        h, w = img_gray.shape[:2]
+        if w > self.max_reference_width:
+            scale = self.max_reference_width / w
+            img_gray = cv2.resize(img_gray, (int(w*scale), int(h*scale)))
+
+        keypoints, descriptors = self.detector.detectAndCompute(img_gray, None)
+        return self._add_template(name, img_gray, keypoints, descriptors)
+
+    def add_reference_file(self, path, name=None):
+        """
+        Добавляет шаблон из файла. При заданном store повторная загрузка
+        того же содержимого берёт изображение, точки и дескрипторы из кэша
+        без декодирования и SIFT. None, если файл не читается как изображение.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        name = name or os.path.basename(path)
+
+        key = None
+        if self.store is not None:
+            key = self.store.make_key(data, self.feature_params())
+            cached = self.store.load(key)
+            if cached is not None:
+                image, keypoints, descriptors = cached
+                return self._add_template(name, image, array_to_keypoints(keypoints),
+                                          descriptors if len(descriptors) else None, points=keypoints[:, :2])
+
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            return None
+        template = self.add_reference(img, name)
+        if key is not None:
+            descriptors = template.descriptors
+            if descriptors is None:
+                descriptors = np.empty((0, self.detector.descriptorSize()), self.backend.dtype)
+            self.store.save(key, template.image, keypoints_to_array(template.keypoints), descriptors)
+        return template
+
+    def _add_template(self, name, image, keypoints, descriptors, points=None):
+        template = Template(self._next_id, name or f"Объект {self._next_id}", image, keypoints, descriptors, points)
+        self._next_id += 1
+        # Шаблон без точек найти всё равно нельзя, в индекс его не кладём
+        if descriptors is not None:
+            self.index.add(template)
+        return template
+
+    def remove_reference(self, template_id):
+        self.index.remove(template_id)
+
+    def set_reference(self, img_gray, name=None):
+        """Единственный шаблон вместо всех загруженных"""
+        for template_id in list(self.templates):
+            self.index.remove(template_id)
+        return self.add_reference(img_gray, name)
+
+    def match(self, frame):
+        """
+        Основная логика компьютерного зрения:
+        1. Найти точки на кадре.
+        2. Сопоставить их сразу со всеми шаблонами через общий индекс.
+        3. Для шаблонов с достаточным числом совпадений найти гомографию
+           и спроецировать углы шаблона на кадр.
+        """
+        if not self.templates:
+            return FrameMatches()
+
+        # Конвертируем кадр в оттенки серого для SIFT
+        with self.profiler.stage("gray"):
+            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return self.match_gray(frame_gray)
+
+    def match_gray(self, frame_gray):
+        """То же, что match, для кадра в оттенках серого"""
+        if not self.templates:
+            return FrameMatches()
+
+        roi = self._roi(frame_gray.shape) if self.roi_padding is not None else None
+        matches = self._search(frame_gray, roi)
+        if roi is not None:
+            found = {r.template_id for r in matches.results if r.status == "found"}
+            if not self._known.keys() <= found:
+                # Объект потерян в области интереса - ищем на всём кадре
+                self.profiler.count("roi_fallback")
+                matches = self._search(frame_gray, None)
+        self.remember(matches.results)
+        return matches
+
+    def remember(self, results):
+        """Положение найденных объектов для области интереса следующего кадра"""
+        if self.roi_padding is None:
+            return
+        known = {}
+        for r in results:
+            if r.status == "found":
+                previous = self._known.get(r.template_id)
+                known[r.template_id] = (r.corners, previous[0] if previous else r.corners)
+        self._known = known
+
+    def reset(self):
+        """Забыть положения объектов: следующий кадр (другого видео) ищется целиком"""
+        self._known = {}
+        self._since_full = 0
+
+    def _roi(self, shape):
+        """
+        (x0, y0, x1, y1) области поиска и маска внутри неё, или None, если
+        нужен весь кадр: объектов ещё нет или пора пересмотреть кадр целиком
+        """
+        known = [v for k, v in self._known.items() if k in self.templates]
+        if not known or self._since_full >= self.roi_refresh:
+            self._since_full = 0
+            return None
+
+        height, width = shape[:2]
+        rects = []
+        for corners, previous in known:
+            corners = corners.reshape(-1, 2)
+            motion = corners - previous.reshape(-1, 2)
+            # Ожидаемое положение: сдвигаем на движение за прошлый кадр
+            predicted = np.vstack([corners, corners + motion])
+            (x0, y0), (x1, y1) = predicted.min(axis=0), predicted.max(axis=0)
+            pad = self.roi_padding * max(x1 - x0, y1 - y0) + np.abs(motion).max()
+            rects.append((max(int(x0 - pad), 0), max(int(y0 - pad), 0),
+                          min(int(x1 + pad) + 1, width), min(int(y1 + pad) + 1, height)))
+
+        rects = np.array(rects)
+        x0, y0 = rects[:, :2].min(axis=0)
+        x1, y1 = rects[:, 2:].max(axis=0)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        if (x1 - x0) * (y1 - y0) > 0.8 * width * height:
+            # Почти весь кадр: обрезка ничего не сэкономит
+            return None
+
+        mask = None
+        if len(rects) > 1:
+            mask = np.zeros((y1 - y0, x1 - x0), np.uint8)
+            for rx0, ry0, rx1, ry1 in rects:
+                mask[ry0 - y0:ry1 - y0, rx0 - x0:rx1 - x0] = 255
+        self._since_full += 1
+        return (x0, y0, x1, y1), mask
+
+    def _search(self, frame_gray, roi):
+        """Поиск на всём кадре (roi=None) или только в области интереса"""
+        # Находим точки на текущем кадре. Кадр обрезается, а не только
+        # маскируется: так SIFT не строит пирамиду для всего изображения
+        with self.profiler.stage("features"):
+            if roi is None:
+                frame_kp, frame_des = self._extract(frame_gray, None)
+            else:
+                (x0, y0, x1, y1), mask = roi
+                frame_kp, frame_des = self._extract(frame_gray[y0:y1, x0:x1], mask)
+                for kp in frame_kp:
+                    kp.pt = (kp.pt[0] + x0, kp.pt[1] + y0)
+
+        # Если на кадре нет дескрипторов (темный экран и т.д.)
+        if frame_des is None:
+            return FrameMatches(frame_kp)
+
+        # Сопоставление (KNN) со всеми шаблонами за один запрос
+        with self.profiler.stage("knn_match"):
+            owners, local, dist = self.index.search(frame_des, k=2)
+
+        # Отбор хороших совпадений по тесту Лоу (порог в единицах расстояний индекса)
+        # Недостающие соседи имеют расстояние inf. Без второго соседа тест
+        # не с чем сравнить (LSH не нашёл кандидатов в корзинах), и такое
+        # совпадение отбрасывается: иначе проходил бы сколь угодно далёкий первый
+        with self.profiler.stage("ratio_test"):
+            good = np.isfinite(dist[:, 1]) & (dist[:, 0] < self.backend.ratio_threshold(self.ratio) * dist[:, 1])
+            frame_idx = np.flatnonzero(good)
+            good_owners = owners[good, 0]
+            ref_idx = local[good, 0]
+
+            # Совпадения группируются по шаблонам: сортировка и срезы вместо масок на каждый шаблон
+            order = np.argsort(good_owners, kind="stable")
+            good_owners, ref_idx, frame_idx = good_owners[order], ref_idx[order], frame_idx[order]
+
+        if self.cross_check and len(frame_idx):
+            with self.profiler.stage("cross_check"):
+                keep = self._cross_check(frame_des, good_owners, ref_idx, frame_idx)
+                good_owners, ref_idx, frame_idx = good_owners[keep], ref_idx[keep], frame_idx[keep]
+
+        frame_points = cv2.KeyPoint_convert(frame_kp).reshape(-1, 2)
+        results = []
+        # Больше голосов - раньше в списке
+        template_ids, starts, counts = np.unique(good_owners, return_index=True, return_counts=True)
+        for i in np.argsort(-counts, kind="stable"):
+            group = slice(starts[i], starts[i] + counts[i])
+            results.append(self._locate(self.templates[int(template_ids[i])], ref_idx[group],
+                                        frame_idx[group], frame_points))
+        return FrameMatches(frame_kp, results, frame_points=frame_points)
+
+    def _cross_check(self, frame_des, owners, ref_idx, frame_idx):
+        """
+        Маска взаимных совпадений: точка шаблона, в свою очередь, ближе всего
+        к той же точке кадра. Обратный поиск - один запрос по индексу над
+        дескрипторами кадра; owners должны быть отсортированы
+        """
+        template_ids, starts, counts = np.unique(owners, return_index=True, return_counts=True)
+        ref_des = np.concatenate([self.templates[int(t)].descriptors[ref_idx[s:s + c]]
+                                  for t, s, c in zip(template_ids, starts, counts)])
+        reverse, _ = self.backend.build_index(frame_des).knn(np.ascontiguousarray(ref_des), 1)
+        return reverse.ravel() == frame_idx
+
+    def _extract(self, image, mask):
+        """Точки и дескрипторы, при заданном max_per_cell - не больше стольких на клетку"""
+        if self.max_per_cell is None:
+            return self.detector.detectAndCompute(image, mask)
+        keypoints = self.detector.detect(image, mask)
+        if len(keypoints) > self.max_per_cell:
+            keypoints = self._cap_per_cell(keypoints)
+        if not keypoints:
+            return keypoints, None
+        return self.detector.compute(image, keypoints)
+
+    def _cap_per_cell(self, keypoints):
+        points = cv2.KeyPoint_convert(keypoints)
+        response = np.float32([kp.response for kp in keypoints])
+        cells = (points // self.cell_size).astype(np.int64)
+        cell = cells[:, 1] * (cells[:, 0].max() + 1) + cells[:, 0]
+        # Внутри каждой клетки - по убыванию отклика
+        order = np.lexsort((-response, cell))
+        sorted_cells = cell[order]
+        first = np.searchsorted(sorted_cells, sorted_cells, side="left")
+        keep = order[np.arange(len(order)) - first < self.max_per_cell]
+        return [keypoints[i] for i in np.sort(keep)]
+
+    def _locate(self, template, ref_idx, frame_idx, frame_points):
+        """Гомография одного шаблона по его совпадениям"""
+        # Гомографии нужно не меньше 4 пар точек при любом min_match_count
+        if len(ref_idx) < max(self.min_match_count, 4):
+            return MatchResult(template.id, "few_matches", ref_idx, frame_idx)
+
+        # Получаем координаты точек из совпадений
+        src_pts = template.points[ref_idx].reshape(-1, 1, 2)
+        dst_pts = frame_points[frame_idx].reshape(-1, 1, 2)
+
+        # Находим матрицу гомографии
+        with self.profiler.stage("homography"):
+            M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+        if M is None:
+            return MatchResult(template.id, "no_homography", ref_idx, frame_idx)
+
+        return MatchResult(template.id, "found", ref_idx, frame_idx, M, project_corners(template, M),
+                           mask.ravel().astype(bool))
+
+
+class MatchRenderer:
+    """
+    Отрисовка результатов поиска сразу в разрешении экрана. Кадр один раз
+    масштабируется в переиспользуемый буфер, а многоугольники, инлайеры и
+    линии совпадений рисуются поверх в экранных координатах: полноразмерных
+    копий кадра и холста drawMatches на каждый кадр не создаётся.
+
+    Режимы: "polygon" - только найденные объекты, "inliers" - ещё и точки,
+    согласные с гомографией, "matches" - с одним шаблоном шаблон и кадр
+    рядом и линии совпадений между ними (как cv2.drawMatches).
+    """
+
+    MODES = ("polygon", "inliers", "matches")
+
+    def __init__(self, matcher, mode="matches", color=(0, 255, 0)):
+        if mode not in self.MODES:
+            raise ValueError(f"неизвестный режим отрисовки: {mode}")
+        self.matcher = matcher
+        self.profiler = matcher.profiler
+        self.mode = mode
+        self.color = color
+        self._canvas = None    # Результат (BGR), переиспользуется между кадрами
+        self._frame = None     # Уменьшенный кадр для режима matches
+        self._template = None  # ((номер шаблона, размер), уменьшенный шаблон в BGR)
+
+    def render(self, frame, matches, size=None):
+        """
+        Кадр (BGR) с результатами, вписанный в size=(ширина, высота) с
+        сохранением пропорций; size=None - в исходном размере. Возвращаемый
+        буфер перезаписывается следующим вызовом.
+        """
+        templates = self.matcher.templates
+        side_by_side = self.mode == "matches" and len(templates) == 1
+        with self.profiler.stage("render"):
+            if side_by_side:
+                template = next(iter(templates.values()))
+                image, scale, frame_offset = self._side_by_side(frame, template, size)
+            else:
+                image, scale = self._fit(frame, size)
+                frame_offset = 0
+
+            if matches.frame_points is None:
+                return image
+            for result in matches.results:
+                if result.corners is None:
+                    continue
+                label = templates[result.template_id].name if len(templates) > 1 else None
+                draw_object(image, result.corners.reshape(-1, 2) * scale + (frame_offset, 0), label, self.color)
+                if self.mode == "inliers":
+                    points = matches.frame_points[result.frame_idx[result.inliers]] * scale + (frame_offset, 0)
+                    self._draw_points(image, points)
+
+            if side_by_side and matches.results:
+                # Линии всех хороших совпадений лучшего результата, одним вызовом
+                result = matches.results[0]
+                ref_points = template.points[result.ref_idx] * scale
+                frame_points = matches.frame_points[result.frame_idx] * scale + (frame_offset, 0)
+                segments = np.stack([ref_points, frame_points], axis=1).round().astype(np.int32)
+                cv2.polylines(image, segments, False, self.color, 1, cv2.LINE_AA)
+        return image
+
+    def _buffer(self, name, shape):
+        buffer = getattr(self, name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.zeros(shape, np.uint8)
+            setattr(self, name, buffer)
+        return buffer
+
+    @staticmethod
+    def _scale(width, height, size):
+        if size is None:
+            return 1.0
+        return min(size[0] / width, size[1] / height)
+
+    def _resize_into(self, name, image, scale):
+        h, w = image.shape[:2]
+        target = (max(int(w * scale), 1), max(int(h * scale), 1))
+        buffer = self._buffer(name, (target[1], target[0]) + image.shape[2:])
+        if target == (w, h):
+            np.copyto(buffer, image)
+        else:
+            # INTER_LINEAR, а не INTER_AREA: на дробных масштабах кадра в разы быстрее
+            cv2.resize(image, target, dst=buffer, interpolation=cv2.INTER_LINEAR)
+        return buffer
+
+    def _fit(self, frame, size):
+        h, w = frame.shape[:2]
+        scale = self._scale(w, h, size)
+        return self._resize_into("_canvas", frame, scale), scale
+
+    def _side_by_side(self, frame, template, size):
+        """[шаблон] [кадр] в одном буфере экранного размера"""
+        th, tw = template.image.shape[:2]
+        fh, fw = frame.shape[:2]
+        scale = self._scale(tw + fw, max(th, fh), size)
+
+        key = (template.id, scale)
+        if self._template is None or self._template[0] != key:
+            # Шаблон не меняется от кадра к кадру: уменьшаем один раз
+            small = cv2.resize(template.image, (max(int(tw * scale), 1), max(int(th * scale), 1)),
+                               interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+            self._template = (key, cv2.cvtColor(small, cv2.COLOR_GRAY2BGR))
+        small_template = self._template[1]
+        small_frame = self._resize_into("_frame", frame, scale)
+
+        sth, stw = small_template.shape[:2]
+        sfh, sfw = small_frame.shape[:2]
+        canvas = self._buffer("_canvas", (max(sth, sfh), stw + sfw, 3))
+        canvas[:sth, :stw] = small_template
+        canvas[:sfh, stw:] = small_frame
+        # Под более низкой из картинок - чёрное поле (линии прошлого кадра стираются)
+        canvas[sth:, :stw] = 0
+        canvas[sfh:, stw:] = 0
+        # Точки шаблона масштабируются тем же множителем, кадр сдвинут на ширину шаблона
+        return canvas, scale, stw
+
+    def _draw_points(self, image, points, radius=1):
+        """Точки квадратиками (2*radius+1) без цикла по точкам"""
+        h, w = image.shape[:2]
+        x = np.int32(points[:, 0].round())
+        y = np.int32(points[:, 1].round())
+        for dy in range(-radius, radius + 1):
+            for dx in range(-radius, radius + 1):
+                image[np.clip(y + dy, 0, h - 1), np.clip(x + dx, 0, w - 1)] = self.color
@@ -0,0 +1,166 @@
+import cv2
+import numpy as np
+
+from object_matcher import FrameMatches, MatchResult, project_corners
+
+
+class ObjectTrack:
+    """Найденный шаблон, за точками которого следим оптическим потоком"""
+
+    def __init__(self, template, ref_idx, points, homography):
+        self.template = template
+        self.ref_idx = ref_idx    # Номера точек шаблона
+        self.points = points      # Их положение на последнем кадре, форма (N, 1, 2)
+        self.homography = homography
+        self.initial_count = len(ref_idx)  # Сколько инлайеров было при полном поиске
+        self.error = 0.0          # Средняя ошибка перепроецирования, пикселей
+
+
+class HomographyTracker:
+    """
+    Режим слежения для SiftMatcher: после полного поиска инлайеры гомографии
+    ведутся пирамидальным оптическим потоком (Лукас-Канаде), а гомография
+    пересчитывается по этим дешёвым соответствиям. Полный поиск (SIFT +
+    FLANN + RANSAC) выполняется раз в redetect_every кадров или сразу, как
+    только число инлайеров или ошибка перепроецирования ухудшились.
+    Интерфейс совпадает с SiftMatcher.match, поэтому трекер подставляется
+    вместо матчера без изменений в отрисовке.
+    """
+
+    def __init__(self, matcher, redetect_every=15, min_inlier_ratio=0.5, max_error=3.0,
+                 win_size=21, max_level=3, fb_threshold=1.0):
+        self.matcher = matcher
+        self.profiler = matcher.profiler
+        self.redetect_every = max(1, redetect_every)
+        # Доля инлайеров от полного поиска, ниже которой слежению не верим
+        self.min_inlier_ratio = min_inlier_ratio
+        self.max_error = max_error
+        self.fb_threshold = fb_threshold  # Допуск проверки "вперёд-назад", пикселей
+        self.lk_params = dict(winSize=(win_size, win_size), maxLevel=max_level,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+        self.tracks = []
+        self._prev_gray = None
+        self._since_detect = 0
+        self._known_templates = set()
+
+        # Статистика: сколько кадров обработано и на скольких был полный поиск
+        self.frames = 0
+        self.full_detections = 0
+
+    @property
+    def templates(self):
+        return self.matcher.templates
+
+    def match(self, frame):
+        with self.profiler.stage("gray"):
+            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return self.match_gray(frame_gray)
+
+    def match_gray(self, frame_gray):
+        matches = None
+        if self._can_follow(frame_gray):
+            matches = self._follow(frame_gray)
+        if matches is None:
+            matches = self._detect(frame_gray)
+        self._prev_gray = frame_gray
+        self._since_detect += 1
+        self.frames += 1
+        return matches
+
+    def _can_follow(self, frame_gray):
+        return (self.tracks and self._since_detect < self.redetect_every
+                and self._prev_gray is not None and self._prev_gray.shape == frame_gray.shape
+                # Библиотека шаблонов поменялась - нужен полный поиск
+                and self.matcher.templates.keys() == self._known_templates)
+
+    def _detect(self, frame_gray):
+        """Полный поиск и запуск слежения за найденными шаблонами"""
+        matches = self.matcher.match_gray(frame_gray)
+        self.full_detections += 1
+        self._since_detect = 0
+        self._known_templates = set(self.matcher.templates)
+
+        self.tracks = []
+        if matches.frame_points is not None:
+            frame_points = matches.frame_points
+            for result in matches.results:
+                if result.status != "found":
+                    continue
+                inliers = result.inliers
+                if np.count_nonzero(inliers) < self.matcher.min_match_count:
+                    continue
+                points = frame_points[result.frame_idx[inliers]].reshape(-1, 1, 2)
+                self.tracks.append(ObjectTrack(self.matcher.templates[result.template_id],
+                                               result.ref_idx[inliers], points, result.homography))
+        return matches
+
+    def _follow(self, frame_gray):
+        """
+        Один вызов оптического потока на точки всех треков. None, если хотя
+        бы один трек потерял уверенность: тогда кадр ищется полностью.
+        """
+        prev_points = np.concatenate([t.points for t in self.tracks])
+        with self.profiler.stage("optical_flow"):
+            points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, frame_gray, prev_points, None,
+                                                         **self.lk_params)
+            # Проверка "вперёд-назад": точка должна вернуться туда, откуда пришла
+            back, back_status, _ = cv2.calcOpticalFlowPyrLK(frame_gray, self._prev_gray, points, None,
+                                                            **self.lk_params)
+        fb_error = np.linalg.norm((prev_points - back).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.fb_threshold)
+
+        results, frame_points = [], []
+        start = offset = 0
+        for track in self.tracks:
+            end = start + len(track.points)
+            keep = good[start:end]
+            moved = points[start:end][keep]
+            start = end
+            if not self._update(track, track.ref_idx[keep], moved):
+                return None
+
+            frame_points.append(track.points)
+            results.append(MatchResult(track.template.id, "found", track.ref_idx,
+                                       np.arange(offset, offset + len(track.ref_idx)), track.homography,
+                                       project_corners(track.template, track.homography),
+                                       np.ones(len(track.ref_idx), bool)))
+            offset += len(track.ref_idx)
+
+        frame_points = np.concatenate(frame_points).reshape(-1, 2)
+        frame_kp = cv2.KeyPoint_convert(frame_points)
+        # Свежие положения нужны матчеру для области интереса при следующем полном поиске
+        self.matcher.remember(results)
+        return FrameMatches(frame_kp, results, tracked=True, frame_points=frame_points)
+
+    def _update(self, track, ref_idx, points):
+        """Новая гомография трека по сдвинутым точкам; False, если слежение деградировало"""
+        min_count = max(self.matcher.min_match_count, 4, self.min_inlier_ratio * track.initial_count)
+        if len(ref_idx) < min_count:
+            return False
+
+        src_pts = track.template.points[ref_idx].reshape(-1, 1, 2)
+        with self.profiler.stage("homography"):
+            M, mask = cv2.findHomography(src_pts, points, cv2.RANSAC, self.max_error)
+        if M is None:
+            return False
+        inliers = mask.ravel().astype(bool)
+        if np.count_nonzero(inliers) < min_count:
+            return False
+
+        projected = cv2.perspectiveTransform(src_pts[inliers], M)
+        error = float(np.linalg.norm((projected - points[inliers]).reshape(-1, 2), axis=1).mean())
+        if error > self.max_error:
+            return False
+
+        # Дальше ведём только инлайеры: выбросы не накапливаются
+        track.ref_idx = ref_idx[inliers]
+        track.points = np.ascontiguousarray(points[inliers])
+        track.homography = M
+        track.error = error
+        return True
+
+    def reset(self):
+        self.tracks = []
+        self._prev_gray = None
+        self.matcher.reset()
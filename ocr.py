@@ -0,0 +1,88 @@
+"""
+Text recognition shared by the OCR window (lab3.py) and headless tools.
+"""
+import threading
+
+from PIL import Image
+
+from ocr_engines import create_engine
+
+# Language choices offered to users, mapped to Tesseract language codes
+LANGUAGES = {
+    "English": "eng",
+    "Russian": "rus",
+    "Japanese": "jpn",
+    "English + Russian": "eng+rus",
+    "English + Japanese": "eng+jpn",
+    "All Three": "eng+rus+jpn"
+}
+
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+
+def default_engine():
+    """Process-wide engine (tesserocr if installed), created on first use"""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = create_engine()
+        return _default_engine
+
+
+def recognize(image, lang_code, config="", cache=None, engine=None):
+    """
+    Run Tesseract on a PIL image (or an ImageSource) and return the
+    recognized text. With an OCRCache, text already recognized for the same
+    pixels, language and config is returned without running Tesseract.
+    """
+    if isinstance(image, ImageSource):
+        image = image.image()
+    engine = engine or default_engine()
+    if cache is None:
+        return engine.recognize(image, lang_code, config)
+
+    key = cache.make_key(image, {"lang": lang_code, "config": config})
+    text = cache.get(key)
+    if text is None:
+        text = engine.recognize(image, lang_code, config)
+        cache.put(key, text)
+    return text
+
+
+class ImageSource:
+    """
+    An image file kept apart from anything shown on screen. The full
+    resolution pixels are decoded only when recognition needs them (on the
+    OCR worker, not the Tk thread) and then kept for re-runs with another
+    language; previews are separate, cheaply decoded copies.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Reads only the header: fails fast on files that are not images
+        with Image.open(path) as image:
+            self.size = image.size
+            self.format = image.format
+        self._image = None
+        self._lock = threading.Lock()
+
+    def image(self):
+        """Full resolution PIL image, decoded on first use"""
+        with self._lock:
+            if self._image is None:
+                image = Image.open(self.path)
+                image.load()
+                self._image = image
+            return self._image
+
+    def preview(self, size):
+        """
+        Thumbnail that fits size. JPEGs are decoded straight at 1/2..1/8
+        scale (draft mode), so a large scan never gets decoded in full here.
+        """
+        with Image.open(self.path) as image:
+            image.draft("RGB", (size[0] * 2, size[1] * 2))
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            return image.copy()
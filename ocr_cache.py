@@ -0,0 +1,162 @@
+"""
+Cache of OCR results keyed by image content.
+
+Recognizing the same pixels with the same language and options always gives
+the same text, so the key is a hash of the decoded image plus those
+parameters: re-running a document, switching back to a language tried
+before or meeting a duplicate scan in a batch skips Tesseract entirely.
+
+Results live in two tiers: a small in-memory LRU for the running process
+and a directory of text files shared by all runs and processes, trimmed
+back to a size limit by evicting the least recently used entries.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "FindFaceAndEyes", "ocr")
+
+
+def image_digest(image):
+    """Hash of a PIL image's pixels; the same picture saved as PNG or TIFF gets the same digest"""
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Two-tier cache of recognized text. Safe to share between the OCR worker
+    thread and the UI; separate processes share only the disk tier.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, memory_items=256, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # Counted on the first write, then kept up to date
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image, params):
+        """Key for an image recognized with params (language, Tesseract config, preprocessing)"""
+        digest = hashlib.sha256(image_digest(image).encode("ascii"))
+        digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        # Two directory levels so a big cache does not end up in one folder
+        return os.path.join(self.directory, key[:2], key + ".txt")
+
+    def get(self, key):
+        """Cached text or None"""
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return text
+
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._remember(key, text)
+
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        data = text.encode("utf-8")
+
+        # Write to a temporary file and rename it: a concurrent reader sees
+        # either the whole entry or none
+        fd, tmp = tempfile.mkstemp(dir=parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._disk_usage()
+            else:
+                self._disk_bytes += len(data)
+            over_limit = self._disk_bytes > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _entries(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".txt"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue  # Evicted by another process meanwhile
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Remove least recently used files until the cache is back under 80% of max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.8
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def clear(self):
+        """Drop both tiers"""
+        with self._lock:
+            self._memory.clear()
+        for _, _, path in list(self._entries()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = 0
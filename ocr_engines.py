@@ -0,0 +1,175 @@
+"""
+Ways of running Tesseract.
+
+pytesseract writes every image to a temporary file and starts a tesseract
+process that loads the traineddata of each language again; for
+"eng+rus+jpn" and small images that startup is most of the time. With
+tesserocr installed, TesserocrEngine keeps initialized Tesseract instances
+per language/config in the process and hands them images from memory.
+pytesseract stays available as the fallback and for setups without
+tesserocr.
+"""
+import importlib.util
+import shlex
+import threading
+from collections import OrderedDict
+
+import pytesseract
+
+# Warm Tesseract instances a TesserocrEngine keeps by default
+MAX_IDLE = 4
+
+
+class OCREngine:
+    """Recognizes text on PIL images; safe to call from several threads"""
+
+    name = None
+
+    def recognize(self, image, lang_code, config=""):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PytesseractEngine(OCREngine):
+    """One tesseract process per call"""
+
+    name = "pytesseract"
+
+    def recognize(self, image, lang_code, config=""):
+        return pytesseract.image_to_string(image, lang=lang_code, config=config)
+
+
+def parse_config(config):
+    """
+    (psm, oem, variables) from a tesseract command line config such as
+    "--psm 6 -c preserve_interword_spaces=1"
+    """
+    psm = oem = None
+    variables = {}
+    args = shlex.split(config)
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("--psm", "--oem", "-c") and i + 1 < len(args):
+            value = args[i + 1]
+            if arg == "--psm":
+                psm = int(value)
+            elif arg == "--oem":
+                oem = int(value)
+            else:
+                name, _, var = value.partition("=")
+                variables[name] = var
+            i += 2
+        else:
+            raise ValueError(f"unsupported Tesseract option for tesserocr: {arg}")
+    return psm, oem, variables
+
+
+class TesserocrEngine(OCREngine):
+    """
+    Warm Tesseract instances from tesserocr, one pool per (language, config).
+    An instance serves one call at a time, so concurrent calls with the same
+    language get instances of their own; idle instances beyond max_idle are
+    closed, least recently used first.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, max_idle=MAX_IDLE):
+        # Imported here rather than at module import: libtesseract's OpenMP
+        # runtime reads OMP_THREAD_LIMIT when it is loaded, and batch workers
+        # set it only after the fork
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.max_idle = max_idle
+        self._idle = OrderedDict()  # (lang_code, config) -> [idle instances]
+        self._idle_count = 0
+        self._lock = threading.Lock()
+
+    def _create(self, lang_code, config):
+        psm, oem, variables = parse_config(config)
+        options = {"lang": lang_code, "variables": variables}
+        if psm is not None:
+            options["psm"] = psm
+        if oem is not None:
+            options["oem"] = oem
+        try:
+            return self._tesserocr.PyTessBaseAPI(**options)
+        except RuntimeError as e:
+            # Worded like Tesseract's own message so callers can tell a missing language apart
+            raise RuntimeError(f"Failed loading language '{lang_code}': {e}") from e
+
+    def _acquire(self, key):
+        with self._lock:
+            instances = self._idle.get(key)
+            if instances:
+                self._idle.move_to_end(key)
+                self._idle_count -= 1
+                return instances.pop()
+        return self._create(*key)
+
+    def _release(self, key, api):
+        with self._lock:
+            self._idle.setdefault(key, []).append(api)
+            self._idle.move_to_end(key)
+            self._idle_count += 1
+            evicted = []
+            while self._idle_count > self.max_idle:
+                oldest = next(iter(self._idle))
+                evicted.append(self._idle[oldest].pop(0))
+                if not self._idle[oldest]:
+                    del self._idle[oldest]
+                self._idle_count -= 1
+        for instance in evicted:
+            instance.End()
+
+    def recognize(self, image, lang_code, config=""):
+        key = (lang_code, config)
+        api = self._acquire(key)
+        try:
+            # The image goes to Tesseract from memory; the GIL is released while it works
+            api.SetImage(image)
+            text = api.GetUTF8Text()
+            api.Clear()
+        except BaseException:
+            api.End()  # Do not return an instance in an unknown state to the pool
+            raise
+        self._release(key, api)
+        return text
+
+    def close(self):
+        with self._lock:
+            instances = [api for apis in self._idle.values() for api in apis]
+            self._idle.clear()
+            self._idle_count = 0
+        for api in instances:
+            api.End()
+
+
+ENGINES = {
+    "pytesseract": PytesseractEngine,
+    "tesserocr": TesserocrEngine,
+}
+
+
+def tesserocr_available():
+    return importlib.util.find_spec("tesserocr") is not None
+
+
+def create_engine(name="auto"):
+    """Engine by name; "auto" is tesserocr when installed, pytesseract otherwise"""
+    if name == "auto":
+        name = "tesserocr" if tesserocr_available() else "pytesseract"
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"unknown OCR engine: {name}") from None
+    return engine_class()
+
+
+def add_engine_arguments(parser):
+    """Common engine option for entry points"""
+    parser.add_argument("--engine", choices=("auto", *ENGINES), default="auto",
+                        help="tesserocr keeps Tesseract loaded in the process; pytesseract runs it per call")
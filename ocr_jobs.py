@@ -0,0 +1,138 @@
+"""
+Background OCR jobs for the OCR window.
+
+Recognition runs on a worker thread so the Tk loop never blocks on
+Tesseract. Job state changes are published on an event queue that the UI
+thread drains from its own after() loop; the worker never touches Tk.
+"""
+import queue
+import threading
+import time
+
+import ocr
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class OCRJob:
+    """One image + language pair waiting for, going through or done with OCR"""
+
+    def __init__(self, job_id, name, image, lang_code, options=None):
+        self.id = job_id
+        self.name = name
+        self.image = image
+        self.lang_code = lang_code
+        self.options = options or {}  # Extra keyword arguments for the recognizer
+        self.status = QUEUED
+        self.text = None
+        self.error = None  # Exception raised by the recognizer, if any
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self._cancel_requested = False
+
+    @property
+    def is_finished(self):
+        return self.status in (DONE, CANCELLED, FAILED)
+
+    @property
+    def elapsed(self):
+        """Recognition time in seconds (so far, if still running)"""
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+
+class OCRWorker(threading.Thread):
+    """
+    Runs queued OCR jobs one at a time. Tesseract already uses several
+    threads per page, so running jobs side by side would only make each of
+    them slower.
+
+    Cancelling a queued job drops it before it starts. A job that is already
+    running cannot interrupt the Tesseract call; it is marked cancelled
+    right away and its result is discarded when the call returns.
+    """
+
+    def __init__(self, recognize=ocr.recognize):
+        super().__init__(name="ocr-worker", daemon=True)
+        self.recognize = recognize
+        self.events = queue.Queue()  # Jobs whose state changed, drained by the UI thread
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.jobs = []  # Every submitted job, in submission order
+        self.active = None  # Job whose Tesseract call is in progress (even if already cancelled)
+
+    def submit(self, image, lang_code, name=None, options=None):
+        """Queue an image for recognition and return its OCRJob"""
+        with self._lock:
+            job = OCRJob(self._next_id, name or f"image {self._next_id}", image, lang_code, options)
+            self._next_id += 1
+            self.jobs.append(job)
+        self._jobs.put(job)
+        self.events.put(job)
+        return job
+
+    def cancel(self, job):
+        """True if the job was still pending and is now cancelled"""
+        with self._lock:
+            if job.is_finished:
+                return False
+            job._cancel_requested = True
+            if job.status == QUEUED:
+                job.image = None  # The worker will skip it without looking at the image
+            # A running job is reported as cancelled now; its result is dropped later
+            job.status = CANCELLED
+        self.events.put(job)
+        return True
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            self.cancel(job)
+
+    @property
+    def pending(self):
+        """Jobs that are queued or running"""
+        with self._lock:
+            return [job for job in self.jobs if not job.is_finished]
+
+    def run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            with self._lock:
+                if job._cancel_requested:
+                    continue
+                job.status = RUNNING
+                job.started = time.monotonic()
+                self.active = job
+            self.events.put(job)
+
+            text, error = None, None
+            try:
+                text = self.recognize(job.image, job.lang_code, **job.options)
+            except Exception as e:
+                error = e
+
+            with self._lock:
+                self.active = None
+                job.finished = time.monotonic()
+                job.image = None  # Large scans should not stay in memory with the job list
+                if job._cancel_requested:
+                    continue
+                job.text = text
+                job.error = error
+                job.status = FAILED if error is not None else DONE
+            self.events.put(job)
+
+    def close(self):
+        """Drop queued jobs and stop after the current one"""
+        self.cancel_all()
+        if self.is_alive():
+            self._jobs.put(None)
@@ -0,0 +1,258 @@
+"""
+Preprocessing and text-region detection ahead of Tesseract.
+
+Large posters, screenshots and photos are mostly background, and sending
+them as one page costs time and often confuses Tesseract's layout analysis.
+Here candidate text blocks are found with a few cheap OpenCV operations on
+a downscaled copy, each block is recognized as an independent tile (tiles
+run in parallel threads), and the text is put back together in reading
+order, keeping every block's bounding box.
+
+Optional preprocessing before recognition: DPI normalization, deskew and
+binarization.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import ocr
+from ocr_engines import MAX_IDLE
+
+# box - (x, y, w, h) in the coordinates of the preprocessed image
+TextRegion = namedtuple("TextRegion", "box text")
+
+# Region search runs on a copy no larger than this (longest side, pixels)
+DETECT_MAX_SIDE = 1600
+
+# DPI normalization enlarges an image at most this many times, and never past
+# MAX_PIXELS (about an A4 page at 350 DPI). Photos often store a nominal
+# 72 DPI, which would otherwise turn a 12 MP shot into a 200 MP one.
+MAX_UPSCALE = 2.0
+MAX_PIXELS = 12_000_000
+
+# Each tile is one uniform block of text
+TILE_CONFIG = "--psm 6"
+
+# Tiles recognized at once by default. More would oversubscribe the CPUs with
+# Tesseract's own threads, and with tesserocr would create instances beyond
+# the engine's warm pool, which then get closed and reload their languages
+# on every page.
+TILE_WORKERS = MAX_IDLE
+
+# Tesseract runs parts of its LSTM on up to this many OpenMP threads per call
+# unless OMP_THREAD_LIMIT says otherwise
+TESSERACT_THREADS = 4
+
+
+def default_tile_workers():
+    """
+    Tiles to recognize at once so that their OpenMP threads fit the CPUs.
+    The environment is left alone: a process-wide OMP_THREAD_LIMIT would
+    also slow down whole-page recognition, which is one call at a time.
+    """
+    try:
+        threads = int(os.environ.get("OMP_THREAD_LIMIT", TESSERACT_THREADS))
+    except ValueError:
+        threads = TESSERACT_THREADS
+    threads = max(1, min(threads, TESSERACT_THREADS))
+    return max(1, min(TILE_WORKERS, (os.cpu_count() or 1) // threads))
+
+
+def to_gray(image):
+    """PIL image as a grayscale uint8 array"""
+    return np.asarray(image if image.mode == "L" else image.convert("L"))
+
+
+def normalize_dpi(gray, dpi, target_dpi):
+    """
+    Rescale so that text has the size it would have if scanned at target_dpi.
+    Enlarging is limited by MAX_UPSCALE and MAX_PIXELS, so images that are
+    already that large keep their size.
+    """
+    if not dpi or not target_dpi:
+        return gray
+    factor = target_dpi / float(dpi)
+    if factor > 1:
+        h, w = gray.shape[:2]
+        factor = max(1.0, min(factor, MAX_UPSCALE, (MAX_PIXELS / float(h * w)) ** 0.5))
+    if abs(factor - 1.0) < 0.05:
+        return gray
+    interpolation = cv2.INTER_CUBIC if factor > 1 else cv2.INTER_AREA
+    return cv2.resize(gray, None, fx=factor, fy=factor, interpolation=interpolation)
+
+
+def estimate_skew(gray):
+    """Text rotation in degrees from the dark pixels' minimal bounding rectangle"""
+    scale = min(1.0, DETECT_MAX_SIDE / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    _, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    points = cv2.findNonZero(ink)
+    if points is None or len(points) < 10:
+        return 0.0
+    angle = cv2.minAreaRect(points)[-1]
+    # The rectangle's angle is only defined up to 90 degrees (and its range differs
+    # between OpenCV versions); bring it to [-45, 45)
+    return (angle + 45) % 90 - 45
+
+
+def deskew_gray(gray, max_angle=20.0):
+    angle = estimate_skew(gray)
+    if abs(angle) < 0.1 or abs(angle) > max_angle:
+        return gray
+    h, w = gray.shape
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, M, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def binarize_gray(gray):
+    """Adaptive threshold: copes with uneven lighting on photos better than a global one"""
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+
+
+def preprocess(image, binarize=False, deskew=False, target_dpi=None):
+    """
+    Grayscale copy of a PIL image prepared for Tesseract. DPI normalization
+    needs the resolution stored in the file; images without it keep their size.
+    """
+    gray = to_gray(image)
+    dpi = image.info.get("dpi")
+    gray = normalize_dpi(gray, dpi[0] if dpi else None, target_dpi)
+    if deskew:
+        gray = deskew_gray(gray)
+    if binarize:
+        gray = binarize_gray(gray)
+    return Image.fromarray(gray)
+
+
+def find_text_regions(gray, padding=8):
+    """
+    Bounding boxes (x, y, w, h) of likely text blocks. Strokes are found by
+    the morphological gradient, joined into line candidates, filtered by how
+    much of their box is ink, and merged into blocks of neighbouring lines.
+    """
+    h, w = gray.shape
+    scale = min(1.0, DETECT_MAX_SIDE / max(h, w))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, strokes = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    lines = cv2.morphologyEx(strokes, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    text_mask = np.zeros_like(lines)
+    heights = []
+    for contour in contours:
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if cw < 8 or ch < 6 or ch > small.shape[0] * 0.5:
+            continue
+        # Text lines are densely filled with strokes; texture and edges of photos are not
+        if cv2.countNonZero(strokes[y:y + ch, x:x + cw]) < 0.2 * cw * ch:
+            continue
+        text_mask[y:y + ch, x:x + cw] = 255
+        heights.append(ch)
+    if not heights:
+        return []
+
+    # Words and lines of one paragraph merge into a block, blocks further apart stay
+    # separate; gaps are measured against the typical line height
+    line_height = float(np.median(heights))
+    kernel = (int(line_height * 1.5) | 1, int(line_height * 0.8) | 1)
+    blocks = cv2.dilate(text_mask, cv2.getStructuringElement(cv2.MORPH_RECT, kernel))
+    contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for contour in contours:
+        x, y, cw, ch = cv2.boundingRect(contour)
+        x0 = max(int(x / scale) - padding, 0)
+        y0 = max(int(y / scale) - padding, 0)
+        x1 = min(int((x + cw) / scale) + padding, w)
+        y1 = min(int((y + ch) / scale) + padding, h)
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return reading_order(boxes)
+
+
+def reading_order(boxes):
+    """
+    Boxes sorted top to bottom, left to right within a row. A box joins the
+    current row when it overlaps the row vertically by at least half of the
+    smaller height, so side-by-side columns are read left column first.
+    """
+    rows = []
+    for box in sorted(boxes, key=lambda b: b[1]):
+        x, y, w, h = box
+        if rows:
+            row = rows[-1]
+            top, bottom = row["top"], row["bottom"]
+            overlap = min(bottom, y + h) - max(top, y)
+            if overlap >= 0.5 * min(h, bottom - top):
+                row["boxes"].append(box)
+                row["bottom"] = max(bottom, y + h)
+                continue
+        rows.append({"top": y, "bottom": y + h, "boxes": [box]})
+    return [box for row in rows for box in sorted(row["boxes"])]
+
+
+def recognize_regions(image, lang_code, config=TILE_CONFIG, cache=None, engine=None, workers=None,
+                      binarize=False):
+    """
+    TextRegion for every detected block of a PIL image, in reading order.
+    Tiles go through ocr.recognize (so the cache works per tile) on up to
+    workers threads (default_tile_workers() by default); Tesseract releases
+    the GIL. Binarization is applied to
+    the tiles only: on the whole image it turns photo texture into
+    stroke-like noise that the region search would take for text.
+    """
+    gray = to_gray(image)
+    boxes = find_text_regions(gray)
+    if not boxes:
+        return []
+
+    def recognize_tile(box):
+        x, y, w, h = box
+        tile = gray[y:y + h, x:x + w]
+        if binarize:
+            tile = binarize_gray(tile)
+        return ocr.recognize(Image.fromarray(tile), lang_code, config, cache=cache, engine=engine)
+
+    engine = engine or ocr.default_engine()
+    workers = min(workers or default_tile_workers(), getattr(engine, "max_idle", TILE_WORKERS))
+    if workers == 1 or len(boxes) == 1:
+        texts = [recognize_tile(box) for box in boxes]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(boxes))) as executor:
+            texts = list(executor.map(recognize_tile, boxes))
+    return [TextRegion(box, text.strip()) for box, text in zip(boxes, texts) if text.strip()]
+
+
+def regions_to_text(regions):
+    return "\n\n".join(region.text for region in regions)
+
+
+def recognize_layout(image, lang_code, regions=False, binarize=False, deskew=False, dpi=None,
+                     config="", cache=None, engine=None, workers=None):
+    """
+    TextRegions of a PIL image (or ocr.ImageSource) after the optional
+    preprocessing. Without region splitting the whole page is one region;
+    without any options this is plain ocr.recognize.
+    """
+    if isinstance(image, ocr.ImageSource):
+        image = image.image()
+    if not regions:
+        if binarize or deskew or dpi:
+            image = preprocess(image, binarize, deskew, dpi)
+        text = ocr.recognize(image, lang_code, config, cache=cache, engine=engine)
+        return [TextRegion((0, 0, image.width, image.height), text)]
+
+    if deskew or dpi:
+        image = preprocess(image, deskew=deskew, target_dpi=dpi)
+    return recognize_regions(image, lang_code, config or TILE_CONFIG, cache=cache, engine=engine,
+                             workers=workers, binarize=binarize)
+
+
+def recognize_page(image, lang_code, **options):
+    """Text of recognize_layout's regions, in reading order"""
+    return regions_to_text(recognize_layout(image, lang_code, **options))
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import deque
+
+from instrumentation import NULL_PROFILER, FpsMeter
+
+
+class LatestQueue:
+    """
+    Ограниченная очередь "побеждает последний кадр":
+    при переполнении самый старый необработанный элемент выбрасывается.
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0  # Сколько устаревших кадров было выброшено
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Ждёт элемент; None при таймауте или после close()"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def get_nowait(self):
+        with self._cond:
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class Stage(threading.Thread):
+    """Фоновая стадия конвейера: крутит step() до остановки"""
+
+    def __init__(self, name, step):
+        super().__init__(name=name, daemon=True)
+        self._step = step
+        self._stop_event = threading.Event()
+        self.fps = FpsMeter()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            # step() возвращает True, если кадр был обработан
+            if self._step():
+                self.fps.tick()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class FramePipeline:
+    """
+    Конвейер захват -> детекция -> отображение.
+    Захват и детекция работают в своих потоках, отображение забирает
+    последний кадр из Tk-цикла и накладывает на него последние найденные
+    лица, поэтому видео идёт с частотой камеры, даже если детектор отстаёт.
+    """
+
+    def __init__(self, vid, detector, profiler=NULL_PROFILER):
+        self.vid = vid
+        self.detector = detector
+        self.profiler = profiler
+
+        self.detect_queue = LatestQueue()
+        self.display_queue = LatestQueue()
+
+        self._lock = threading.Lock()
+        self._detections = []
+
+        self.capture_stage = Stage("capture", self._capture_step)
+        self.detect_stage = Stage("detect", self._detect_step)
+        self.display_fps = FpsMeter()
+
+    def start(self):
+        self.capture_stage.start()
+        self.detect_stage.start()
+
+    def stop(self):
+        for stage in (self.capture_stage, self.detect_stage):
+            stage.stop()
+        self.detect_queue.close()
+        self.display_queue.close()
+        for stage in (self.capture_stage, self.detect_stage):
+            if stage.is_alive():
+                stage.join(timeout=1.0)
+
+    def _capture_step(self):
+        with self.profiler.stage("capture"):
+            ret, frame = self.vid.read()
+        if not ret:
+            time.sleep(0.01)
+            return False
+        self.detect_queue.put(frame)
+        self.display_queue.put(frame)
+        return True
+
+    def _detect_step(self):
+        frame = self.detect_queue.get(timeout=0.1)
+        if frame is None:
+            return False
+        detections = self.detector.detect(frame)
+        with self._lock:
+            self._detections = detections
+        return True
+
+    @property
+    def detections(self):
+        with self._lock:
+            return self._detections
+
+    def next_display_frame(self):
+        """
+        Новый кадр для отображения и актуальные детекции или None,
+        если с прошлого вызова камера ничего не прислала.
+        Кадр в это время может читать детектор, поэтому менять его нельзя.
+        """
+        frame = self.display_queue.get_nowait()
+        if frame is None:
+            return None
+        return frame, self.detections
+
+    def stats(self):
+        return {
+            "capture_fps": self.capture_stage.fps.fps,
+            "detect_fps": self.detect_stage.fps.fps,
+            "display_fps": self.display_fps.fps,
+            "detect_dropped": self.detect_queue.dropped,
+            "display_dropped": self.display_queue.dropped,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"Захват {s['capture_fps']:.1f} | Детекция {s['detect_fps']:.1f} | "
+                f"Экран {s['display_fps']:.1f} к/с | Пропущено {s['detect_dropped']}")
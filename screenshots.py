@@ -0,0 +1,100 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import cv2
+
+from face_detector import draw_detections, face_to_dict
+
+
+class ScreenshotWriter(threading.Thread):
+    """
+    Фоновая запись скриншотов: кодирование PNG и работа с диском не
+    блокируют Tk-цикл. Разметка рисуется здесь же по уже найденным лицам.
+    """
+
+    def __init__(self, directory=".", prefix="screenshot", save_raw=False, save_metadata=False,
+                 max_pending=64):
+        super().__init__(name="screenshot-writer", daemon=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.save_raw = save_raw
+        self.save_metadata = save_metadata
+        os.makedirs(directory, exist_ok=True)
+
+        # Ограниченная очередь: при непрерывной съёмке память не растёт
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._next_index = self._scan_next_index()
+
+        self.saved = 0
+        self.dropped = 0
+        self.last_saved = None
+        self.last_error = None
+
+    def _scan_next_index(self):
+        """Один проход по каталогу при старте, дальше номера выдаются счётчиком"""
+        pattern = re.compile(rf"^{re.escape(self.prefix)}(?:_(\d+))?\.png$")
+        last = -1
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                last = max(last, int(match.group(1) or 0))
+        return last + 1
+
+    def _allocate_name(self):
+        index = self._next_index
+        self._next_index += 1
+        name = f"{self.prefix}.png" if index == 0 else f"{self.prefix}_{index}.png"
+        return os.path.normpath(os.path.join(self.directory, name))
+
+    def submit(self, frame, detections):
+        """
+        Ставит кадр в очередь записи и сразу возвращает имя будущего файла
+        (None, если очередь переполнена и кадр пропущен).
+        frame больше не должен изменяться вызывающим кодом.
+        """
+        filename = self._allocate_name()
+        try:
+            self._queue.put_nowait((filename, frame, detections, time.time()))
+        except queue.Full:
+            self._next_index -= 1
+            self.dropped += 1
+            return None
+        return filename
+
+    def run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self._write(*job)
+            except Exception as e:
+                self.last_error = f"{job[0]}: {e}"
+            finally:
+                self._queue.task_done()
+
+    def _write(self, filename, frame, detections, timestamp):
+        base = os.path.splitext(filename)[0]
+        # Быстрое сжатие: непрерывная съёмка не должна отставать от камеры
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+        if self.save_raw:
+            cv2.imwrite(base + "_raw.png", frame, params)
+        cv2.imwrite(filename, draw_detections(frame.copy(), detections), params)
+        if self.save_metadata:
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump({"image": os.path.basename(filename), "timestamp": timestamp,
+                           "faces": [face_to_dict(face) for face in detections]}, f, ensure_ascii=False)
+
+        self.saved += 1
+        self.last_saved = filename
+
+    def close(self, timeout=5.0):
+        """Дописывает очередь и останавливает поток"""
+        if self.is_alive():
+            self._queue.put(None)
+            self.join(timeout)
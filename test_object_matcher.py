@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from feature_backends import create_backend
+from object_matcher import Template, TemplateIndex
+
+
+def make_template(template_id, descriptors):
+    return Template(template_id, f"t{template_id}", None, [], descriptors, np.zeros((len(descriptors), 2)))
+
+
+def random_descriptors(rng, features, count):
+    if features == "sift":
+        return rng.random((count, 128), dtype=np.float32)
+    return rng.integers(0, 256, (count, 32), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("features", ["sift", "orb"])
+def test_search_after_removal_matches_fresh_index(features):
+    """Индекс с помеченными удалёнными шаблонами ищет так же, как построенный заново"""
+    rng = np.random.default_rng(0)
+    backend = create_backend(features, index="bf")
+    query = random_descriptors(rng, features, 50)
+
+    # Удаляемый шаблон содержит копии запросов: в индексе они вытесняют всех
+    # живых соседей, и без повторного поиска второй сосед был бы inf.
+    # Добавленный первым, он попадает в основной сегмент, а не в дельту
+    templates = [make_template(0, np.concatenate([query, query, query]))]
+    templates += [make_template(i, random_descriptors(rng, features, 200)) for i in range(1, 7)]
+
+    index = TemplateIndex(backend)
+    for template in templates:
+        index.add(template)
+    index.remove(0)
+    assert index._removed, "удаление должно только пометить шаблон"
+
+    fresh = TemplateIndex(backend)
+    for template in templates[1:]:
+        fresh.add(template)
+
+    owners, local, dist = index.search(query, k=2)
+    fresh_owners, fresh_local, fresh_dist = fresh.search(query, k=2)
+    assert np.isfinite(dist).all()
+    np.testing.assert_allclose(dist, fresh_dist, rtol=1e-5)
+    # Среди равноудалённых бинарных дескрипторов порядок может различаться
+    unique = dist[:, 0] != dist[:, 1]
+    np.testing.assert_array_equal(owners[unique, 0], fresh_owners[unique, 0])
+    np.testing.assert_array_equal(local[unique, 0], fresh_local[unique, 0])
@@ -0,0 +1,128 @@
+import cv2
+
+from face_detector import Face, iou, move_boxes
+
+
+class Track:
+    """Отслеживаемое лицо со стабильным номером"""
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.missed = 0  # Сколько полных детекций подряд лицо не находилось
+        # Кэш глаз и рамка лица, на которой они были найдены
+        self.eyes = None
+        self.eyes_face = None
+
+
+class FaceTracker:
+    """
+    Режим слежения: полный проход каскада лиц выполняется раз в detect_every
+    кадров или сразу после потери хотя бы одного трека. В промежутках каждое
+    лицо ищется тем же каскадом только в окне вокруг прошлой рамки.
+    Интерфейс совпадает с FaceEyeDetector, поэтому трекер можно подставить
+    вместо детектора и в обычный цикл, и в конвейер.
+    """
+
+    def __init__(self, detector, detect_every=10, padding=0.5, iou_threshold=0.3, max_missed=2,
+                 eye_reuse_threshold=0.1):
+        self.detector = detector
+        self.detect_every = max(1, detect_every)
+        self.padding = padding
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        # Допустимый сдвиг/изменение размера лица (доля ширины), при котором глаза не ищутся заново
+        self.eye_reuse_threshold = eye_reuse_threshold
+
+        self.tracks = []
+        self._next_id = 1
+        self._since_detect = 0
+        self._force_detect = True
+
+        # Статистика: сколько кадров обработано и на скольких был полный проход
+        self.frames = 0
+        self.full_detections = 0
+        self.eye_searches = 0
+
+    def detect(self, frame):
+        with self.detector.profiler.stage("gray"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return self.detect_gray(gray)
+
+    def detect_gray(self, gray):
+        if self._force_detect or self._since_detect >= self.detect_every:
+            self._associate(self.detector.detect_faces(gray))
+            self._since_detect = 0
+            self._force_detect = False
+            self.full_detections += 1
+        else:
+            self._follow(gray)
+        self._since_detect += 1
+        self.frames += 1
+
+        return [Face(t.box, self._eyes_for(gray, t), t.id)
+                for t in self.tracks if t.missed == 0]
+
+    def _eyes_for(self, gray, track):
+        """Глаза трека: из кэша, пока лицо почти не сдвинулось, иначе новый поиск"""
+        if track.eyes is not None and not self._face_moved(track.eyes_face, track.box):
+            return move_boxes(track.eyes, track.eyes_face, track.box)
+        track.eyes = self.detector.detect_eyes(gray, track.box)
+        track.eyes_face = track.box
+        self.eye_searches += 1
+        return track.eyes
+
+    def _face_moved(self, old, new):
+        limit = self.eye_reuse_threshold * old[2]
+        return (abs(new[0] - old[0]) > limit or abs(new[1] - old[1]) > limit
+                or abs(new[2] - old[2]) > limit or abs(new[3] - old[3]) > limit)
+
+    def _follow(self, gray):
+        """Дешёвое слежение: локальный поиск вокруг каждого трека"""
+        for track in self.tracks:
+            if track.missed:
+                continue
+            box = self.detector.detect_face_near(gray, track.box, self.padding)
+            if box is None:
+                # Уверенность упала: на следующем кадре нужен полный проход
+                track.missed = 1
+                self._force_detect = True
+            else:
+                track.box = box
+
+    def _associate(self, boxes):
+        """Сопоставление результатов полной детекции с треками по IoU"""
+        pairs = sorted(
+            ((iou(track.box, box), ti, bi)
+             for ti, track in enumerate(self.tracks) for bi, box in enumerate(boxes)),
+            reverse=True)
+
+        matched_tracks, matched_boxes = set(), set()
+        for overlap, ti, bi in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if ti in matched_tracks or bi in matched_boxes:
+                continue
+            matched_tracks.add(ti)
+            matched_boxes.add(bi)
+            self.tracks[ti].box = boxes[bi]
+            self.tracks[ti].missed = 0
+            # Полная детекция заодно обновляет глаза, чтобы кэш не жил вечно
+            self.tracks[ti].eyes = None
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.missed += 1
+            if track.missed <= self.max_missed:
+                survivors.append(track)
+
+        for bi, box in enumerate(boxes):
+            if bi not in matched_boxes:
+                survivors.append(Track(self._next_id, box))
+                self._next_id += 1
+        self.tracks = survivors
+
+    def reset(self):
+        self.tracks = []
+        self._force_detect = True